@@ -0,0 +1,297 @@
+"""Benchmarks of every generation stage.
+
+    python -m city bench --out bench.json
+    python -m city bench --baseline bench.json
+    python -m bench --quick
+
+Each case reports its best time over a few runs, its throughput (noise
+points, vertices...) per second and the peak memory traced by tracemalloc
+while it runs. The vertex and index bytes of typical meshes are reported
+too, in V3c4 with 32 bit indices, with 16 bit indices, and quantized (see
+geometry.mesh_node). Results can be saved as JSON and compared with a saved
+baseline, in which case cases slower than the baseline by more than the
+tolerance are flagged and the exit status is non-zero.
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy
+from panda3d.core import GeomVertexFormat, Vec3
+
+import noise
+import noise_backends
+from buildings import Building, BuildingBatch
+from chunks import chunk
+from geometry import mesh_node
+from placement import Placement
+from terrain import Heightfield, Landmarks, Terrain, road_mesh
+
+
+def vertices(node):
+    return sum(node.getGeom(i).getVertexData().getNumRows()
+               for i in range(node.getNumGeoms()))
+
+
+def noise_cases(points):
+    rng = numpy.random.default_rng(0)
+    xs, ys, zs, ws = rng.uniform(-1000.0, 1000.0, (4, points))
+    coords = list(zip(xs.tolist(), ys.tolist(), zs.tolist(), ws.tolist()))
+
+    def scalar(function, dimensions):
+        def run():
+            for c in coords:
+                function(*c[:dimensions])
+            return points
+        return run
+
+    def array(function, *args):
+        def run():
+            function(*args)
+            return points
+        return run
+
+    def octave():
+        for x, y, z, w in coords:
+            noise.octave_noise_2d(4, 0.5, 0.01, x, y)
+        return points
+
+    yield 'noise.raw_noise_2d', 'points', scalar(noise.raw_noise_2d, 2)
+    yield 'noise.raw_noise_3d', 'points', scalar(noise.raw_noise_3d, 3)
+    yield 'noise.raw_noise_4d', 'points', scalar(noise.raw_noise_4d, 4)
+    yield 'noise.octave_noise_2d', 'points', octave
+    yield 'noise.raw_noise_2d_array', 'points', array(noise.raw_noise_2d_array, xs, ys)
+    yield 'noise.raw_noise_3d_array', 'points', array(noise.raw_noise_3d_array, xs, ys, zs)
+    yield 'noise.raw_noise_4d_array', 'points', array(noise.raw_noise_4d_array, xs, ys, zs, ws)
+    yield ('noise.octave_noise_2d_array', 'points',
+           array(noise.octave_noise_2d_array, 4, 0.5, 0.01, xs, ys))
+    for name in noise_backends.available():
+        backend = noise_backends.get(name)
+        yield ('noise_backends.%s.raw_noise_2d' % name, 'points',
+               array(backend.raw_noise_2d, xs, ys))
+    yield 'noise.raw_noise_2d_grad_array', 'points', array(noise.raw_noise_2d_grad_array, xs, ys)
+    yield 'noise.raw_noise_3d_grad_array', 'points', array(noise.raw_noise_3d_grad_array, xs, ys, zs)
+
+
+def terrain_cases(resolutions):
+    for resolution in resolutions:
+        def run(resolution=resolution):
+            terrain = Terrain(heightfield=Heightfield(10000.0, resolution))
+            return terrain.geom().getVertexData().getNumRows()
+        yield 'Terrain.geom[%gm]' % resolution, 'vertices', run
+
+
+def landmarks_cases(densities):
+    heightfield = Heightfield()
+    for density in densities:
+        def construct(density=density):
+            random.seed(0)
+            return len(Landmarks(8000, density, heightfield=heightfield).points)
+
+        yield 'Landmarks[%g]' % density, 'points', construct
+        # Only the primitives are timed, on a network built beforehand
+        random.seed(0)
+        landmarks = Landmarks(8000, density, heightfield=heightfield)
+
+        def primitives(landmarks=landmarks):
+            return vertices(landmarks.node())
+
+        yield 'Landmarks.primitives[%g]' % density, 'vertices', primitives
+
+
+def building_cases(levels):
+    border = (
+        Vec3(0.0, 0.0, 0.0),
+        Vec3(0.0, 50.0, 0.0),
+        Vec3(50.0, 50.0, 0.0),
+        Vec3(50.0, 0.0, 0.0),
+        )
+    for count in levels:
+        def run(count=count):
+            building = Building(border=border, tops=[i * 2.5 for i in range(count)])
+            return vertices(building.node())
+        yield 'Building.node[%d]' % count, 'vertices', run
+
+
+def building_batch_cases(buildings, levels=70):
+    square = numpy.array([(0.0, 0.0), (0.0, 50.0), (50.0, 50.0), (50.0, 0.0)])
+    for n in buildings:
+        def run(n=n):
+            rng = numpy.random.default_rng(0)
+            xy = rng.uniform(-5000.0, 5000.0, (n, 1, 2)) + square
+            footprints = numpy.concatenate((xy, numpy.zeros((n, 4, 1))), axis=2)
+            batch = BuildingBatch(footprints, numpy.full(n, levels))
+            return sum(len(vertices) for vertices, colors, indices in batch.meshes())
+        yield 'BuildingBatch.meshes[%d]' % n, 'vertices', run
+
+
+def placement_cases(lots):
+    heightfield = Heightfield()
+    random.seed(0)
+    roads = Landmarks(8000, 2.5e-6, heightfield=heightfield).graph.index().edges
+    for n in lots:
+        def run(n=n):
+            # Room for about twice as many lots as wanted
+            radius = max(5000.0, 50.0 * numpy.sqrt(2 * n / numpy.pi))
+            placement = Placement(radius, roads=roads)
+            return len(placement.place(n, numpy.random.default_rng(0)))
+        yield 'Placement.place[%d]' % n, 'lots', run
+
+
+def cases(quick=False):
+    if quick:
+        yield from noise_cases(2000)
+        yield from terrain_cases([80.0, 40.0])
+        yield from landmarks_cases([1e-6, 2.5e-6])
+        yield from building_cases([10, 100])
+        yield from building_batch_cases([1000])
+        yield from placement_cases([1000, 10000])
+    else:
+        yield from noise_cases(20000)
+        yield from terrain_cases([80.0, 40.0, 20.0, 10.0])
+        yield from landmarks_cases([1e-6, 2.5e-6, 1e-5])
+        yield from building_cases([10, 50, 100])
+        yield from building_batch_cases([1000, 10000, 100000])
+        yield from placement_cases([1000, 10000, 100000])
+
+
+def mesh_bytes(node):
+    """Bytes of vertex and index data in a GeomNode, as sent to the GPU."""
+    total = 0
+    for i in range(node.getNumGeoms()):
+        geom = node.getGeom(i)
+        vdata = geom.getVertexData()
+        total += sum(vdata.getArray(k).getDataSizeBytes()
+                     for k in range(vdata.getNumArrays()))
+        total += sum(geom.getPrimitive(k).getVertices().getDataSizeBytes()
+                     for k in range(geom.getNumPrimitives()))
+    return total
+
+
+def mesh_cases():
+    """(name, function) pairs, each function returning mesh arrays."""
+    def terrain_chunk():
+        return chunk(0, 1280.0, 80.0, (0, 0))[1]
+
+    def roads():
+        heightfield = Heightfield()
+        random.seed(0)
+        landmarks = Landmarks(8000, 2.5e-6, heightfield=heightfield)
+        edges = landmarks.edges[:1024]
+        points = landmarks.points
+        return road_mesh(points[edges[:, 0]], points[edges[:, 1]], heightfield)
+
+    def buildings():
+        square = numpy.array([(0.0, 0.0), (0.0, 50.0), (50.0, 50.0), (50.0, 0.0)])
+        xy = numpy.random.default_rng(0).uniform(-5000.0, 5000.0, (100, 1, 2)) + square
+        footprints = numpy.concatenate((xy, numpy.zeros((100, 4, 1))), axis=2)
+        return BuildingBatch(footprints, numpy.full(100, 70)).arrays()
+
+    yield 'terrain chunk', terrain_chunk
+    yield 'roads[1024]', roads
+    yield 'buildings[100]', buildings
+
+
+def mesh_memory(only=None):
+    """Bytes of each of mesh_cases in the V3c4 format with 32 bit indices,
+    with 16 bit indices where they fit, and also quantized."""
+    results = {}
+    for name, mesh in mesh_cases():
+        name = 'mesh bytes[%s]' % name
+        if only and only not in name:
+            continue
+        vertices, colors, indices = mesh()
+        standard = (len(vertices) * GeomVertexFormat.getV3c4().getArray(0).getStride() +
+                    numpy.size(indices) * 4)
+        indexed = mesh_bytes(mesh_node(name, vertices, colors, indices, quantized=False))
+        quantized = mesh_bytes(mesh_node(name, vertices, colors, indices, quantized=True))
+        results[name] = {
+            'standard_bytes': standard,
+            'index16_bytes': indexed,
+            'quantized_bytes': quantized,
+            }
+        print('%-36s %10d bytes %10d (-%.0f%%) %10d (-%.0f%%)' % (
+            name, standard,
+            indexed, 100.0 * (1 - indexed / standard),
+            quantized, 100.0 * (1 - quantized / standard)))
+    return results
+
+
+def measure(function, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        count = function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    # Tracing slows Python code down a lot, so memory gets a run of its own
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, count, peak
+
+
+def run(quick=False, repeat=3, only=None):
+    results = {}
+    for name, unit, function in cases(quick):
+        if only and only not in name:
+            continue
+        seconds, count, peak = measure(function, repeat)
+        results[name] = {
+            'seconds': seconds,
+            'count': count,
+            'unit': unit,
+            'rate': count / seconds if seconds else float('inf'),
+            'peak_bytes': peak,
+            }
+        print('%-36s %10.4fs %14.0f %s/s %10.1f MiB' % (
+            name, seconds, results[name]['rate'], unit, peak / 2.0**20))
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    """Names of the cases slower than in `baseline` beyond `tolerance`."""
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline or 'seconds' not in result:
+            continue
+        ratio = result['seconds'] / baseline[name]['seconds']
+        if ratio > 1.0 + tolerance:
+            regressions.append(name)
+            print('REGRESSION %-36s %.2fx slower' % (name, ratio))
+    return regressions
+
+
+def add_arguments(parser):
+    parser.add_argument('--out', help='save the results as JSON')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed slowdown against the baseline')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--quick', action='store_true', help='smaller cases')
+    parser.add_argument('--only', help='only cases whose name contains this')
+
+
+def main(args):
+    results = run(args.quick, args.repeat, args.only)
+    results.update(mesh_memory(args.only))
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=4, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='bench', description=__doc__.split('\n')[0])
+    add_arguments(parser)
+    main(parser.parse_args())
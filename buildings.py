@@ -1,16 +1,46 @@
+import numpy
 from panda3d.core import (
     Geom,
     GeomNode,
-    GeomTristrips,
     GeomVertexFormat,
     GeomVertexData,
-    GeomVertexWriter,
+    LODNode,
+    NodePath,
     Vec3,
     )
 
+from geometry import merge, mesh_node, strip_triangles, triangles, write_vertices
+from profiling import count, span
 from utils import center, lerp
 
 
+# Distances at which buildings switch to a simpler level of detail: full
+# detail up to the first, then a tapered prism, then a box, then nothing
+LOD_DISTANCES = (400.0, 1200.0, 4000.0)
+
+
+def prism_arrays(bottom, top, colors, cover=True):
+    """Walls between the `bottom` and `top` rings of a prism, and its ceiling.
+
+    `bottom` and `top` are (n, 3) arrays of corners, `colors` the colours of
+    the bottom and top rings.
+    """
+    n = len(bottom)
+    vertices = numpy.concatenate((bottom, top))
+    colors = numpy.repeat(colors, n, axis=0)
+    # Wall
+    wall = numpy.empty(2 * n + 2, dtype=numpy.int64)
+    wall[0:-2:2] = numpy.arange(n)
+    wall[1:-2:2] = numpy.arange(n) + n
+    wall[-2:] = (0, n)
+    indices = [strip_triangles([wall])]
+    # Ceiling
+    if cover:
+        ceil = numpy.append(numpy.arange(n, 2 * n), n)
+        indices.append(strip_triangles([ceil]))
+    return vertices, colors, numpy.concatenate(indices)
+
+
 class Level:
 
     def __init__(self, border, top, cover=True):
@@ -19,37 +49,23 @@ class Level:
         self.top = top
         self.cover = cover
 
+    def arrays(self):
+        bottom = numpy.array([(p.x, p.y, p.z) for p in self.border])
+        top = bottom + (0.0, 0.0, self.top)
+        return prism_arrays(bottom, top, [(0.5, 0.5, 0.5, 0.0), (1.0, 1.0, 1.0, 0.0)],
+                            self.cover)
+
     def primitives(self, vdata):
-        vertex = GeomVertexWriter(vdata, 'vertex')
-        color = GeomVertexWriter(vdata, 'color')
-        n = len(self.border)
-        # Points
-        for p in self.border:
-            vertex.addData3f(p.x, p.y, p.z)
-            color.addData4f(0.5, 0.5, 0.5, 0.0)
-        for p in self.border:
-            vertex.addData3f(p.x, p.y, p.z + self.top)
-            color.addData4f(1.0, 1.0, 1.0, 0.0)
-        # Wall
-        wall = GeomTristrips(Geom.UHStatic)
-        for i in range(n):
-            wall.addVertices(i, i + n)
-        wall.addVertices(0, n)
-        wall.closePrimitive()
-        yield wall
-        # Ceiling
-        if self.cover:
-            ceil = GeomTristrips(Geom.UHStatic)
-            ceil.addConsecutiveVertices(n, n)
-            ceil.addVertex(n)
-            ceil.closePrimitive()
-            yield ceil
+        vertices, colors, indices = self.arrays()
+        write_vertices(vdata, vertex=vertices, color=colors)
+        yield triangles(indices)
 
     def geom(self):
         vdata = GeomVertexData('LevelVD', self.fmt, Geom.UHStatic)
         geom = Geom(vdata)
         for primitive in self.primitives(vdata):
             geom.addPrimitive(primitive)
+        count('geoms')
         return geom
 
     def node(self):
@@ -60,22 +76,205 @@ class Level:
 
 class Building:
 
-    def __init__(self, border, tops):
+    def __init__(self, border, tops, taper=0.99):
+        self.fmt = GeomVertexFormat.getV3c4()
         self.border = border
         self.tops = tops
+        self.taper = taper
         self.levels = []
         n = len(tops)
         for i in range(n):
             border = [Vec3(p.x, p.y, p.z + i * 2.5) for p in self.border]
             c = center(border)
-            border = [lerp(p, c, 1 - 0.99 ** i) for p in border]
+            border = [lerp(p, c, 1 - taper ** i) for p in border]
             top = (i + 1) * 2.5
             level = Level(border=border, top=top, cover=True)
             self.levels.append(level)
 
+    def arrays(self):
+        # All levels share one vertex table and one set of triangles
+        return merge(level.arrays() for level in self.levels)
+
+    def primitives(self, vdata):
+        vertices, colors, indices = self.arrays()
+        write_vertices(vdata, vertex=vertices, color=colors)
+        yield triangles(indices)
+
+    def geom(self):
+        vdata = GeomVertexData('BuildingVD', self.fmt, Geom.UHStatic)
+        geom = Geom(vdata)
+        for primitive in self.primitives(vdata):
+            geom.addPrimitive(primitive)
+        count('geoms')
+        return geom
+
     def node(self):
-        node = GeomNode('BuildingNode')
-        for level in self.levels:
-            node.addGeom(level.geom())
+        # Through mesh_node, so archetypes are quantized along with the rest
+        return mesh_node('BuildingNode', *self.arrays(), fmt=self.fmt)
+
+    def height(self):
+        """Height of the top of the highest level above the footprint."""
+        if not self.levels:
+            return 0.0
+        last = self.levels[-1]
+        return last.border[0].z + last.top - self.border[0].z
+
+    def prism_arrays(self):
+        """The whole building as one prism, up to its top level's ceiling."""
+        bottom = numpy.array([(p.x, p.y, p.z) for p in self.border])
+        if self.levels:
+            last = self.levels[-1]
+            top = numpy.array([(p.x, p.y, p.z + last.top) for p in last.border])
+        else:
+            top = bottom
+        return prism_arrays(bottom, top, [(0.5, 0.5, 0.5, 0.0), (1.0, 1.0, 1.0, 0.0)])
+
+    def box_arrays(self):
+        """The bounding box of the footprint, full height, in one colour."""
+        xs = [p.x for p in self.border]
+        ys = [p.y for p in self.border]
+        z = self.border[0].z
+        bottom = numpy.array([
+            (min(xs), min(ys), z),
+            (min(xs), max(ys), z),
+            (max(xs), max(ys), z),
+            (max(xs), min(ys), z),
+            ])
+        top = bottom + (0.0, 0.0, self.height())
+        return prism_arrays(bottom, top, [(0.75, 0.75, 0.75, 0.0)] * 2)
+
+    def lod_node(self, distances=LOD_DISTANCES):
+        """LODNode switching from full detail to a prism, then a box.
+
+        `distances` are the distances from the camera where each level of
+        detail ends, the box disappearing beyond the last one.
+        """
+        node = LODNode('BuildingLOD')
+        node.setCenter(center(self.border) + Vec3(0.0, 0.0, self.height() / 2))
+        near = 0.0
+        for far, child in zip(distances, (
+                self.node(),
+                mesh_node('BuildingPrism', *self.prism_arrays(), fmt=self.fmt),
+                mesh_node('BuildingBox', *self.box_arrays(), fmt=self.fmt))):
+            node.addSwitch(far, near)
+            node.addChild(child)
+            near = far
         return node
 
+
+class BuildingBatch:
+    """Many buildings generated together from arrays.
+
+    `footprints` is a (b, n, 3) array of the corners of b buildings,
+    `levels` the number of levels of each and `tapers` their taper. Every
+    level of every building is computed in a few array operations rather
+    than one Vec3 at a time, giving the same geometry as the Buildings with
+    `levels` tops `height` apart, merged into one vertex table.
+    """
+
+    def __init__(self, footprints, levels, tapers=0.99, height=2.5):
+        self.footprints = numpy.asarray(footprints, dtype=numpy.float64)
+        self.levels = numpy.asarray(levels, dtype=numpy.int64)
+        self.tapers = numpy.broadcast_to(
+            numpy.asarray(tapers, dtype=numpy.float64), self.levels.shape)
+        self.height = height
+        self.fmt = GeomVertexFormat.getV3c4()
+
+    def __len__(self):
+        return len(self.levels)
+
+    def arrays(self, start=0, stop=None):
+        """Merged mesh arrays of buildings `start` to `stop`."""
+        footprints = self.footprints[start:stop]
+        levels = self.levels[start:stop]
+        tapers = self.tapers[start:stop]
+        n = footprints.shape[1]
+        # One row per level: its building and its number in the building
+        owner = numpy.repeat(numpy.arange(len(levels)), levels)
+        i = numpy.arange(len(owner)) - numpy.repeat(numpy.cumsum(levels) - levels, levels)
+        bottom = footprints[owner]
+        bottom[:, :, 2] += (i * self.height)[:, None]
+        c = bottom.mean(axis=1, keepdims=True)
+        bottom += (c - bottom) * (1 - tapers[owner] ** i)[:, None, None]
+        top = bottom.copy()
+        top[:, :, 2] += ((i + 1) * self.height)[:, None]
+        # Every level has the layout of a Level's prism
+        zeros = numpy.zeros((n, 3))
+        _, colors, indices = prism_arrays(
+            zeros, zeros, [(0.5, 0.5, 0.5, 0.0), (1.0, 1.0, 1.0, 0.0)])
+        vertices = numpy.concatenate((bottom, top), axis=1).reshape(-1, 3)
+        colors = numpy.tile(colors, (len(owner), 1))
+        indices = (indices[None] + (numpy.arange(len(owner)) * 2 * n)[:, None, None]
+                   ).reshape(-1, indices.shape[1])
+        count('buildings', len(levels))
+        return vertices, colors, indices
+
+    def meshes(self, batch=1024):
+        """Mesh arrays of every `batch` consecutive buildings."""
+        for start in range(0, len(self), batch):
+            with span('building construction'):
+                mesh = self.arrays(start, start + batch)
+            yield mesh
+
+    def nodes(self, batch=1024):
+        for mesh in self.meshes(batch):
+            yield mesh_node('BuildingBatch', *mesh, fmt=self.fmt)
+
+
+class Archetypes:
+    """Buildings generated once per distinct shape and instanced elsewhere.
+
+    Footprints are keyed by their shape relative to their first corner and
+    normalised to unit size, so footprints that only differ in position or
+    horizontal scale share one archetype. Tapering and level heights don't
+    depend on the footprint size, so scaling an archetype horizontally gives
+    the same geometry as building the scaled footprint.
+
+    With `lods`, archetypes are Building.lod_node()s switching at these
+    distances; LODNode measures them in camera space, so the instance scale
+    doesn't change them.
+    """
+
+    def __init__(self, lods=LOD_DISTANCES):
+        self.lods = lods
+        self.cache = {}
+
+    def shape(self, border):
+        origin = border[0]
+        extent = max(max(abs(p.x - origin.x), abs(p.y - origin.y)) for p in border)
+        extent = extent or 1.0
+        shape = tuple(
+            (round((p.x - origin.x) / extent, 4),
+             round((p.y - origin.y) / extent, 4),
+             round(p.z - origin.z, 2))
+            for p in border)
+        return origin, extent, shape
+
+    def get(self, shape, tops, taper=0.99):
+        key = (shape, tuple(tops), taper)
+        archetype = self.cache.get(key)
+        if archetype is None:
+            with span('building construction'):
+                border = [Vec3(x, y, z) for x, y, z in shape]
+                building = Building(border=border, tops=tops, taper=taper)
+                if self.lods:
+                    archetype = NodePath(building.lod_node(self.lods))
+                else:
+                    archetype = NodePath(building.node())
+            self.cache[key] = archetype
+            count('archetypes')
+        return archetype
+
+    def instance(self, border, tops, taper=0.99):
+        origin, extent, shape = self.shape(border)
+        nodePath = NodePath('BuildingInstance')
+        nodePath.setPos(origin)
+        nodePath.setScale(extent, extent, 1.0)
+        self.get(shape, tops, taper).instanceTo(nodePath)
+        count('buildings')
+        return nodePath
+
+    def place(self, parent, border, tops, taper=0.99):
+        nodePath = self.instance(border, tops, taper)
+        nodePath.reparentTo(parent)
+        return nodePath
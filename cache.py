@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+
+import numpy
+from panda3d.core import Filename, Loader, LoaderOptions, NodePath
+
+import geometry
+from terrain import Heightfield
+
+
+# Bumped whenever the layout written by save_world changes
+VERSION = 9
+
+
+def key(params):
+    """Stable hash of generation parameters and of the vertex format of the
+    cached scene graphs."""
+    text = json.dumps([VERSION, params, geometry.QUANTIZE], sort_keys=True)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+def write_bam(nodePath, path):
+    nodePath.writeBamFile(Filename.fromOsSpecific(path))
+
+
+def read_bam(path):
+    options = LoaderOptions(LoaderOptions.LFNoCache)
+    node = Loader.getGlobalPtr().loadSync(Filename.fromOsSpecific(path), options)
+    return NodePath(node)
+
+
+def save_world(world, path, bam=True):
+    """Write `world` to the directory `path`.
+
+    The heightfield, road graph and building table are stored as NumPy
+    archives and, with `bam`, the road and building scene graphs as .bam
+    files. params.json is written last and marks the directory complete.
+    """
+    os.makedirs(path, exist_ok=True)
+    heightfield = world.heightfield
+    numpy.savez(os.path.join(path, 'heightfield.npz'),
+                diameter=heightfield.diameter,
+                resolution=heightfield.resolution,
+                origin=heightfield.origin,
+                heights=heightfield.heights,
+                dx=heightfield.dx,
+                dy=heightfield.dy)
+    numpy.savez(os.path.join(path, 'roads.npz'),
+                points=world.points, edges=world.edges)
+    numpy.savez(os.path.join(path, 'buildings.npz'),
+                footprints=world.footprints,
+                levels=world.levels,
+                tapers=world.tapers)
+    if bam:
+        write_bam(world.roads, os.path.join(path, 'roads.bam'))
+        write_bam(world.buildings, os.path.join(path, 'buildings.bam'))
+    with open(os.path.join(path, 'params.json'), 'w') as f:
+        json.dump(world.params, f, indent=4, sort_keys=True)
+
+
+def load_world(world, path):
+    """Fill `world` from a directory written by save_world with bam."""
+    if not os.path.exists(os.path.join(path, 'params.json')):
+        return False
+    with numpy.load(os.path.join(path, 'heightfield.npz')) as data:
+        world.heightfield = Heightfield(
+            data['diameter'], data['resolution'], tuple(data['origin']),
+            heights=data['heights'], dx=data['dx'], dy=data['dy'])
+    with numpy.load(os.path.join(path, 'roads.npz')) as data:
+        world.points = data['points']
+        world.edges = data['edges']
+    with numpy.load(os.path.join(path, 'buildings.npz')) as data:
+        world.footprints = data['footprints']
+        world.levels = data['levels']
+        world.tapers = data['tapers']
+    world.roads = read_bam(os.path.join(path, 'roads.bam'))
+    world.buildings = read_bam(os.path.join(path, 'buildings.bam'))
+    world.seed_noise()
+    return True
+
+
+class WorldCache:
+    """Generated worlds stored on disk, one directory per parameter hash."""
+
+    def __init__(self, directory='cache'):
+        self.directory = directory
+
+    def path(self, world):
+        return os.path.join(self.directory, key(world.params))
+
+    def load(self, world):
+        return load_world(world, self.path(world))
+
+    def save(self, world):
+        save_world(world, self.path(world))
+
+    def get(self, world, pipeline=None):
+        """Load `world` from the cache, generating and storing it on a miss."""
+        if not self.load(world):
+            world.generate(pipeline)
+            self.save(world)
+        return world
@@ -0,0 +1,143 @@
+from math import floor, hypot
+
+from geometry import mesh_node
+from seeds import generator
+from terrain import QUANTUM, Heightfield, Terrain, elevation
+
+
+def chunk(seed, size, resolution, key):
+    """Heightfield and mesh arrays of the chunk at `key`."""
+    i, j = key
+    origin = ((i + 0.5) * size, (j + 0.5) * size)
+    heightfield = Heightfield(size, resolution, origin)
+    rng = generator(seed, 'terrain', i, j)
+    terrain = Terrain(heightfield=heightfield, rng=rng)
+    return heightfield, terrain.arrays()
+
+
+class TerrainChunks:
+    """Square terrain tiles streamed in around a moving position.
+
+    Chunks within `radius` metres of the position passed to `update` are
+    generated and attached to `parent`. At most `capacity` chunks are kept;
+    beyond that the least recently needed ones, farthest first, are detached
+    and dropped. `capacity` must hold every chunk within `radius`, so that
+    it always bounds the number of chunks kept. Every chunk draws its random numbers from its own stream of
+    `seed`, so it looks the same whenever and wherever it is regenerated.
+    """
+
+    def __init__(self, parent, size=1280.0, resolution=80.0, radius=4000.0,
+                 capacity=64, seed=0):
+        if int(size) % int(resolution):
+            raise ValueError('chunk size must be a multiple of the resolution')
+        self.parent = parent
+        self.size = int(size)
+        self.resolution = int(resolution)
+        self.radius = radius
+        self.capacity = capacity
+        self.seed = seed
+        self.chunks = {}
+        self.used = {}
+        self.tick = 0
+        if capacity < self.most_wanted():
+            raise ValueError('capacity must hold the %d chunks that can be within radius'
+                             % self.most_wanted())
+
+    def most_wanted(self):
+        """Most chunks `wanted` can return, wherever the position is.
+
+        From anywhere in chunk (0, 0), chunk (a, b) is at least
+        max(|a| - 1, 0) and max(|b| - 1, 0) chunks away along each axis.
+        """
+        n = int(self.radius // self.size) + 1
+        count = 0
+        for a in range(-n - 1, n + 2):
+            for b in range(-n - 1, n + 2):
+                dx = max(abs(a) - 1, 0) * self.size
+                dy = max(abs(b) - 1, 0) * self.size
+                if hypot(dx, dy) <= self.radius:
+                    count += 1
+        return count
+
+    def key(self, x, y):
+        return floor(x / self.size), floor(y / self.size)
+
+    def distance(self, key, x, y):
+        # Distance from (x, y) to the closest point of the chunk
+        i, j = key
+        dx = max(i * self.size - x, 0, x - (i + 1) * self.size)
+        dy = max(j * self.size - y, 0, y - (j + 1) * self.size)
+        return hypot(dx, dy)
+
+    def wanted(self, x, y):
+        i0, j0 = self.key(x - self.radius, y - self.radius)
+        i1, j1 = self.key(x + self.radius, y + self.radius)
+        keys = []
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                if self.distance((i, j), x, y) <= self.radius:
+                    keys.append((i, j))
+        keys.sort(key=lambda k: self.distance(k, x, y))
+        return keys
+
+    def build(self, key):
+        return chunk(self.seed, self.size, self.resolution, key)
+
+    def attach(self, key, heightfield, mesh):
+        # Chunks may also be built elsewhere, e.g. on a background thread
+        if key in self.chunks:
+            return
+        node = mesh_node('TerrainChunk%d_%d' % key, *mesh, step=QUANTUM)
+        self.chunks[key] = heightfield, self.parent.attachNewNode(node)
+        self.used[key] = self.tick
+
+    def update(self, position, limit=None):
+        """Generate missing chunks near `position`, nearest first.
+
+        At most `limit` chunks are generated per call, so that callers
+        running every frame can spread the work over several frames.
+        Returns the number of chunks generated.
+        """
+        self.tick += 1
+        x, y = position[0], position[1]
+        wanted = self.wanted(x, y)
+        built = 0
+        for key in wanted:
+            if key not in self.chunks:
+                if limit is not None and built >= limit:
+                    continue
+                self.attach(key, *self.build(key))
+                built += 1
+            self.used[key] = self.tick
+        self.evict(x, y)
+        return built
+
+    def build_many(self, keys, pipeline=None):
+        """(key, heightfield, mesh) of the chunks at `keys`, in order.
+
+        With a Pipeline the chunks are built on its pool. Nothing is
+        attached, so this can run on another thread than `attach`.
+        """
+        if pipeline is None:
+            tiles = (self.build(key) for key in keys)
+        else:
+            tiles = pipeline.chunks(self.seed, self.size, self.resolution, keys)
+        for key, (heightfield, mesh) in zip(keys, tiles):
+            yield key, heightfield, mesh
+
+    def evict(self, x, y):
+        excess = len(self.chunks) - self.capacity
+        if excess <= 0:
+            return
+        stale = [k for k in self.chunks if self.used[k] != self.tick]
+        stale.sort(key=lambda k: (self.used[k], -self.distance(k, x, y)))
+        for key in stale[:excess]:
+            heightfield, nodePath = self.chunks.pop(key)
+            del self.used[key]
+            nodePath.removeNode()
+
+    def sample(self, x, y):
+        chunk = self.chunks.get(self.key(x, y))
+        if chunk is None:
+            return elevation(x, y)
+        return chunk[0].sample(x, y)
@@ -0,0 +1,88 @@
+"""Headless city generation.
+
+    python -m city generate --seed 1 --out cities/1
+    python -m city generate --seed 1 --count 1000 --out cities --workers 8
+    python -m city bench --out bench.json
+
+Runs the whole generation pipeline without opening a window and writes the
+heightfield, road graph and building table of each city (see
+cache.save_world), plus .bam scene graphs with --bam and a binary glTF
+file of the whole scene with --glb (see gltf.export_world). The bench
+command times every stage, see bench.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import bench
+import geometry
+import profiling
+from cache import save_world
+from gltf import export_world
+from pipeline import Pipeline
+from world import World
+
+
+def generate(args):
+    geometry.QUANTIZE = args.compact
+    pipeline = Pipeline(args.workers) if args.workers != 1 else None
+    try:
+        for seed in range(args.seed, args.seed + args.count):
+            start = time.perf_counter()
+            world = World(seed=seed, diameter=args.diameter,
+                          resolution=args.resolution, city=args.city,
+                          density=args.density, buildings=args.buildings)
+            world.generate(pipeline, meshes=args.bam)
+            path = args.out
+            if args.count > 1:
+                path = os.path.join(args.out, 'seed-%d' % seed)
+            save_world(world, path, bam=args.bam)
+            if args.glb:
+                export_world(world, os.path.join(path, 'world.glb'), pipeline=pipeline)
+            print('%s\t%.3fs' % (path, time.perf_counter() - start))
+    finally:
+        if pipeline is not None:
+            pipeline.shutdown()
+    if args.profile:
+        with open(args.profile, 'w') as f:
+            f.write(profiling.dumps())
+
+
+def parser():
+    parser = argparse.ArgumentParser(prog='city', description=__doc__.split('\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    command = commands.add_parser('generate', help='generate cities to disk')
+    command.add_argument('--seed', type=int, default=0)
+    command.add_argument('--count', type=int, default=1,
+                         help='number of cities, with consecutive seeds')
+    command.add_argument('--out', required=True, help='output directory')
+    command.add_argument('--bam', action='store_true',
+                         help='also write road and building .bam files')
+    command.add_argument('--compact', action='store_true',
+                         help='store .bam vertex positions as 16 bit integers')
+    command.add_argument('--glb', action='store_true',
+                         help='also write the terrain, roads and buildings to world.glb')
+    command.add_argument('--workers', type=int, default=1,
+                         help='worker processes, 0 for one per CPU')
+    command.add_argument('--diameter', type=float, default=10000.0)
+    command.add_argument('--resolution', type=float, default=80.0)
+    command.add_argument('--city', type=float, default=8000.0)
+    command.add_argument('--density', type=float, default=2.5/1000000)
+    command.add_argument('--buildings', type=int, default=50)
+    command.add_argument('--profile', help='write a JSON report of time spent per stage')
+    command.set_defaults(run=generate)
+    command = commands.add_parser('bench', help='time every generation stage')
+    bench.add_arguments(command)
+    command.set_defaults(run=bench.main)
+    return parser
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,212 @@
+"""Incremental Delaunay triangulation (Bowyer-Watson).
+
+Points are inserted one at a time into a triangulation that starts as a
+single "super" triangle, large enough to hold every point within `radius`
+of `center`. Each point removes the triangles whose circumcircle contains
+it and fills the hole with a fan around it, so an insertion only touches
+the triangles around the new point. Triangles and edges touching the super
+triangle's corners are never reported, and the corners are treated as
+infinitely far in the circumcircle test of the triangles on the convex hull,
+which keeps the hull edges a finite super triangle would drop.
+"""
+
+import numpy
+
+
+class Change:
+    """What a batch of insertions did to the triangulation.
+
+    Triangles are (n, 3) arrays and edges (n, 2) arrays, lowest point first,
+    of point indices. Triangles and edges both created and destroyed within
+    the batch are left out.
+    """
+
+    def __init__(self, points, created_triangles, destroyed_triangles,
+                 created_edges, destroyed_edges):
+        self.points = points
+        self.created_triangles = created_triangles
+        self.destroyed_triangles = destroyed_triangles
+        self.created_edges = created_edges
+        self.destroyed_edges = destroyed_edges
+
+
+def _triangle_array(triangles):
+    return numpy.array(sorted(triangles), dtype=numpy.int64).reshape(-1, 3)
+
+
+def _edge_array(edges):
+    return numpy.array(sorted(edges), dtype=numpy.int64).reshape(-1, 2)
+
+
+class Delaunay:
+
+    def __init__(self, center=(0.0, 0.0), radius=1e5):
+        # Super triangle corners, far enough not to change the triangulation
+        # of the points inside `radius`
+        r = radius * 1e3
+        cx, cy = center
+        self.xs = [cx - r * 3 ** 0.5, cx + r * 3 ** 0.5, cx]
+        self.ys = [cy - r, cy - r, cy + 2 * r]
+        # Counter clockwise triangles by id, and the triangle on the left of
+        # every directed edge
+        self.triangles = {0: (0, 1, 2)}
+        self.edges = {(0, 1): 0, (1, 2): 0, (2, 0): 0}
+        self.next = 1
+        self.last = 0
+
+    def __len__(self):
+        return len(self.xs) - 3
+
+    def orient(self, a, b, p):
+        xs, ys = self.xs, self.ys
+        return (xs[b] - xs[a]) * (ys[p] - ys[a]) - (ys[b] - ys[a]) * (xs[p] - xs[a])
+
+    def in_circle(self, t, p):
+        """Whether point p is inside the circumcircle of triangle t."""
+        a, b, c = self.triangles[t]
+        xs, ys = self.xs, self.ys
+        if (a < 3) + (b < 3) + (c < 3) == 1:
+            # Triangles on a hull edge are taken as having their super corner
+            # at infinity: their circumcircle is the half plane beyond the
+            # edge, and the edge itself
+            while c >= 3:
+                a, b, c = b, c, a
+            side = self.orient(a, b, p)
+            if side != 0:
+                return side > 0
+            return ((xs[p] - xs[a]) * (xs[p] - xs[b]) +
+                    (ys[p] - ys[a]) * (ys[p] - ys[b])) < 0
+        px, py = xs[p], ys[p]
+        ax, ay = xs[a] - px, ys[a] - py
+        bx, by = xs[b] - px, ys[b] - py
+        cx, cy = xs[c] - px, ys[c] - py
+        return ((ax * ax + ay * ay) * (bx * cy - cx * by) -
+                (bx * bx + by * by) * (ax * cy - cx * ay) +
+                (cx * cx + cy * cy) * (ax * by - bx * ay)) > 0
+
+    def locate(self, p):
+        """Triangle containing point p, walking from the last one created."""
+        t = self.last if self.last in self.triangles else next(iter(self.triangles))
+        while True:
+            a, b, c = self.triangles[t]
+            for u, v in ((a, b), (b, c), (c, a)):
+                if self.orient(u, v, p) < 0:
+                    t = self.edges[(v, u)]
+                    break
+            else:
+                return t
+
+    def add(self, t, a, b, c):
+        self.triangles[t] = (a, b, c)
+        self.edges[(a, b)] = t
+        self.edges[(b, c)] = t
+        self.edges[(c, a)] = t
+
+    def remove(self, t):
+        a, b, c = self.triangles.pop(t)
+        del self.edges[(a, b)]
+        del self.edges[(b, c)]
+        del self.edges[(c, a)]
+        return a, b, c
+
+    def insert_point(self, p, created, destroyed):
+        start = self.locate(p)
+        if any(self.xs[v] == self.xs[p] and self.ys[v] == self.ys[p]
+               for v in self.triangles[start]):
+            # Duplicate point, left out of the triangulation
+            return
+        # Triangles whose circumcircle contains p, and the edges around them
+        cavity = {start}
+        stack = [start]
+        boundary = []
+        while stack:
+            a, b, c = self.triangles[stack.pop()]
+            for u, v in ((a, b), (b, c), (c, a)):
+                n = self.edges.get((v, u))
+                if n is None:
+                    boundary.append((u, v))
+                elif n not in cavity:
+                    if self.in_circle(n, p):
+                        cavity.add(n)
+                        stack.append(n)
+                    else:
+                        boundary.append((u, v))
+        for t in cavity:
+            triangle = self.remove(t)
+            if t in created:
+                created.remove(t)
+            else:
+                destroyed[t] = triangle
+        for u, v in boundary:
+            self.add(self.next, u, v, p)
+            created.add(self.next)
+            self.next += 1
+        self.last = self.next - 1
+
+    def insert(self, points):
+        """Insert an (n, 2) array of points and return the Change.
+
+        Points are numbered in insertion order from 0. They are inserted in
+        an order following the plane in rows, so each walk to the next
+        point's triangle is short.
+        """
+        points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 2)
+        first = len(self.xs)
+        self.xs.extend(points[:, 0].tolist())
+        self.ys.extend(points[:, 1].tolist())
+        created = set()
+        destroyed = {}
+        for k in self.order(points).tolist():
+            self.insert_point(first + k, created, destroyed)
+        # Edges of the triangles destroyed, and of those created, that only
+        # exist on one side of the batch
+        before = set()
+        for a, b, c in destroyed.values():
+            before.update(((a, b), (b, c), (c, a)))
+        destroyed_edges = set()
+        for u, v in before:
+            if (u, v) not in self.edges and (v, u) not in self.edges:
+                destroyed_edges.add((min(u, v), max(u, v)))
+        created_edges = set()
+        for t in created:
+            a, b, c = self.triangles[t]
+            for u, v in ((a, b), (b, c), (c, a)):
+                # Edges with a triangle from before the batch on either side
+                # already existed
+                other = self.edges.get((v, u))
+                if (u, v) in before or (v, u) in before or (
+                        other is not None and other not in created):
+                    continue
+                created_edges.add((min(u, v), max(u, v)))
+        return Change(
+            numpy.arange(first, len(self.xs)) - 3,
+            self.real_triangles(self.triangles[t] for t in created),
+            self.real_triangles(destroyed.values()),
+            self.real_edges(created_edges),
+            self.real_edges(destroyed_edges))
+
+    def order(self, points):
+        """Order of `points` along rows of cells, alternating directions."""
+        if not len(points):
+            return numpy.zeros(0, dtype=numpy.int64)
+        lo = points.min(axis=0)
+        extent = numpy.maximum(points.max(axis=0) - lo, 1e-9)
+        rows = max(int(len(points) ** 0.5 / 2), 1)
+        row = numpy.minimum((points[:, 1] - lo[1]) / extent[1] * rows, rows - 1).astype(numpy.int64)
+        x = numpy.where(row % 2 == 0, points[:, 0], -points[:, 0])
+        return numpy.lexsort((x, row))
+
+    def real_triangles(self, triangles):
+        return _triangle_array(
+            tuple(v - 3 for v in triangle) for triangle in triangles
+            if min(triangle) >= 3)
+
+    def real_edges(self, edges):
+        return _edge_array((u - 3, v - 3) for u, v in edges if u >= 3)
+
+    def points(self):
+        return numpy.stack((self.xs[3:], self.ys[3:]), axis=1).reshape(-1, 2)
+
+    def vertices(self):
+        """Every triangle, as an (n, 3) array of point indices."""
+        return self.real_triangles(self.triangles.values())
@@ -0,0 +1,214 @@
+import numpy
+from panda3d.core import (
+    Geom,
+    GeomNode,
+    GeomTriangles,
+    GeomVertexArrayFormat,
+    GeomVertexData,
+    GeomVertexFormat,
+    InternalName,
+    TransformState,
+    Vec3,
+    )
+
+from profiling import count, timed
+
+
+# Whether mesh_node stores positions as 16 bit integers by default, see
+# quantize
+QUANTIZE = False
+
+_numeric_types = {
+    Geom.NT_uint8: numpy.uint8,
+    Geom.NT_uint16: numpy.uint16,
+    Geom.NT_uint32: numpy.uint32,
+    Geom.NT_int8: numpy.int8,
+    Geom.NT_int16: numpy.int16,
+    Geom.NT_int32: numpy.int32,
+    Geom.NT_float32: numpy.float32,
+    Geom.NT_float64: numpy.float64,
+    }
+
+
+def vertex_dtype(array_format):
+    """NumPy structured dtype with the memory layout of a vertex array."""
+    names, formats, offsets = [], [], []
+    for i in range(array_format.getNumColumns()):
+        column = array_format.getColumn(i)
+        names.append(column.getName().getName())
+        formats.append((_numeric_types[column.getNumericType()],
+                        column.getNumComponents()))
+        offsets.append(column.getStart())
+    return numpy.dtype({
+        'names': names,
+        'formats': formats,
+        'offsets': offsets,
+        'itemsize': array_format.getStride(),
+        })
+
+
+_compact_format = None
+
+
+def compact_format():
+    """Vertex format of 16 bit integer positions and 8 bit RGBA colours.
+
+    12 bytes a vertex, the colour kept 4 byte aligned, against 16 for V3c4;
+    for positions from quantize.
+    """
+    global _compact_format
+    if _compact_format is None:
+        array = GeomVertexArrayFormat()
+        array.addColumn(InternalName.getVertex(), 3, Geom.NT_int16, Geom.C_point)
+        array.addColumn(InternalName.getColor(), 4, Geom.NT_uint8, Geom.C_color)
+        _compact_format = GeomVertexFormat.registerFormat(GeomVertexFormat(array))
+    return _compact_format
+
+
+def quantize(vertices, step=None):
+    """(n, 3) positions as 16 bit integers on a grid of `step` along each axis.
+
+    Returns the integers, and the origin and per axis step mapping them back
+    to positions. `step` defaults to the smallest powers of two fitting the
+    bounding box in 65534 steps. The origin is a whole number of steps, so
+    meshes quantized with the same step round the positions they share the
+    same way and decode them to the same float32 values: pass a common step
+    to meshes that must meet without cracks.
+    """
+    vertices = numpy.asarray(vertices, dtype=numpy.float64)
+    lo = vertices.min(axis=0)
+    hi = vertices.max(axis=0)
+    if step is None:
+        step = 2.0 ** numpy.ceil(numpy.log2(numpy.maximum(hi - lo, 1e-6) / 65534))
+    step = numpy.broadcast_to(numpy.asarray(step, dtype=numpy.float64), (3,))
+    origin = numpy.rint((lo + hi) / 2 / step) * step
+    quantized = numpy.rint((vertices - origin) / step)
+    if numpy.abs(quantized).max() > 32767:
+        raise ValueError('mesh too large to quantize with a step of %r' % (tuple(step),))
+    return quantized.astype(numpy.int16), origin, step
+
+
+def index_type(indices):
+    """Smallest index type holding `indices`: 16 bit up to 65534, else 32."""
+    # 0xffff is reserved as the strip cut index
+    if len(indices) and indices.max() >= 0xffff:
+        return Geom.NT_uint32
+    return Geom.NT_uint16
+
+
+@timed('mesh writing')
+def write_vertices(vdata, **columns):
+    """Fill `vdata` from per-column arrays in a single buffer copy.
+
+    Every keyword names a column of the (single array) vertex format and
+    holds one row per vertex. Float colours in [0, 1] are packed the way
+    GeomVertexWriter packs them into integer colour columns.
+    """
+    array_format = vdata.getFormat().getArray(0)
+    dtype = vertex_dtype(array_format)
+    n = len(next(iter(columns.values())))
+    rows = numpy.zeros(n, dtype)
+    for name, values in columns.items():
+        values = numpy.asarray(values)
+        column = array_format.getColumn(name)
+        target = rows.dtype.fields[name][0].base
+        if (column.getContents() == Geom.C_color and
+                numpy.issubdtype(target, numpy.integer) and
+                numpy.issubdtype(values.dtype, numpy.floating)):
+            limit = numpy.iinfo(target).max
+            values = numpy.clip(values.astype(numpy.float32) * limit, 0, limit)
+        rows[name] = values
+    vdata.uncleanSetNumRows(n)
+    memoryview(vdata.modifyArray(0)).cast('B')[:] = rows.view(numpy.uint8)
+    count('vertices', n)
+
+
+def triangles(indices, numeric_type=None):
+    """Indexed GeomTriangles built from an (n, 3) array in a single copy.
+
+    Indices are 16 bit when they fit, unless `numeric_type` says otherwise.
+    """
+    indices = numpy.asarray(indices).ravel()
+    if numeric_type is None:
+        numeric_type = index_type(indices)
+    indices = numpy.ascontiguousarray(indices, dtype=_numeric_types[numeric_type])
+    primitive = GeomTriangles(Geom.UHStatic)
+    primitive.setIndexType(numeric_type)
+    handle = primitive.modifyVertices()
+    handle.uncleanSetNumRows(len(indices))
+    memoryview(handle).cast('B')[:] = indices.view(numpy.uint8)
+    count('primitives')
+    count('triangles', len(indices) // 3)
+    return primitive
+
+
+def strip_triangles(strips):
+    """Triangles of equally long triangle strips, one strip per row.
+
+    Odd triangles have their first two vertices swapped, as in
+    GeomTristrips.decompose, so the winding matches the strips.
+    """
+    strips = numpy.asarray(strips)
+    a = strips[:, :-2]
+    b = strips[:, 1:-1]
+    c = strips[:, 2:]
+    odd = numpy.arange(a.shape[1]) % 2 == 1
+    first = numpy.where(odd, b, a)
+    second = numpy.where(odd, a, b)
+    return numpy.stack((first, second, c), axis=-1).reshape(-1, 3)
+
+
+def grid_triangles(n):
+    """Triangles of an n by n vertex grid stored row by row.
+
+    Each row of quads is triangulated like a strip zig-zagging between a
+    row of vertices and the next one.
+    """
+    top = numpy.arange(n * (n - 1)).reshape(n - 1, n)
+    strips = numpy.empty((n - 1, 2 * n), dtype=numpy.int64)
+    strips[:, 0::2] = top
+    strips[:, 1::2] = top + n
+    return strip_triangles(strips)
+
+
+def merge(meshes):
+    """Concatenate (vertices, colors, indices) meshes into a single one."""
+    vertices, colors, indices = [], [], []
+    offset = 0
+    for v, c, i in meshes:
+        vertices.append(v)
+        colors.append(c)
+        indices.append(numpy.asarray(i) + offset)
+        offset += len(v)
+    return (numpy.concatenate(vertices),
+            numpy.concatenate(colors),
+            numpy.concatenate(indices))
+
+
+def mesh_node(name, vertices, colors, indices, fmt=None, quantized=None, step=None):
+    """GeomNode with a single Geom built from mesh arrays.
+
+    When `quantized`, or QUANTIZE if it is None, the positions are stored in
+    the compact format, on a grid of `step` (see quantize), and the node's
+    transform scales them back.
+    """
+    if quantized is None:
+        quantized = QUANTIZE
+    if quantized and len(vertices):
+        vertices, origin, scale = quantize(vertices, step)
+        fmt = compact_format()
+    else:
+        quantized = False
+    if fmt is None:
+        fmt = GeomVertexFormat.getV3c4()
+    vdata = GeomVertexData(name + 'VD', fmt, Geom.UHStatic)
+    write_vertices(vdata, vertex=vertices, color=colors)
+    geom = Geom(vdata)
+    geom.addPrimitive(triangles(indices))
+    count('geoms')
+    node = GeomNode(name)
+    node.addGeom(geom)
+    if quantized:
+        node.setTransform(TransformState.makePosHprScale(
+            Vec3(*origin), Vec3(0, 0, 0), Vec3(*scale)))
+    return node
@@ -0,0 +1,198 @@
+"""Binary glTF (.glb) export of generated meshes.
+
+GlbWriter takes (vertices, colors, indices) mesh arrays one at a time and
+appends their buffers to a temporary file straight away, keeping only the
+small JSON description in memory. Closing it writes the .glb: header, JSON
+chunk, then the binary chunk copied over from the temporary file in blocks.
+Memory use is bounded by the largest single mesh, whatever the world size.
+
+Panda3D is Z up and glTF Y up, so positions are written as (x, z, -y).
+"""
+
+import json
+import shutil
+import struct
+import tempfile
+from math import hypot
+
+import numpy
+from panda3d.core import Vec3
+
+from buildings import Archetypes, Building
+from chunks import chunk
+from profiling import count, timed
+from terrain import road_mesh
+
+
+_ARRAY_BUFFER = 34962
+_ELEMENT_ARRAY_BUFFER = 34963
+_FLOAT = 5126
+_UNSIGNED_BYTE = 5121
+_UNSIGNED_INT = 5125
+
+
+def to_gltf(points):
+    """(n, 3) Panda3D coordinates as glTF ones."""
+    points = numpy.asarray(points, dtype=numpy.float64)
+    return numpy.stack((points[:, 0], points[:, 2], -points[:, 1]), axis=1)
+
+
+class GlbWriter:
+
+    def __init__(self, path):
+        self.path = path
+        self.data = tempfile.TemporaryFile()
+        self.length = 0
+        self.json = {
+            'asset': {'version': '2.0', 'generator': 'procedural-city'},
+            'scene': 0,
+            'scenes': [{'nodes': []}],
+            'nodes': [],
+            'meshes': [],
+            'accessors': [],
+            'bufferViews': [],
+            'buffers': [],
+            'materials': [{
+                'pbrMetallicRoughness': {'metallicFactor': 0.0, 'roughnessFactor': 1.0},
+                'doubleSided': True,
+                }],
+            }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.close()
+        else:
+            self.data.close()
+
+    def view(self, array, target, stride=None):
+        """Append `array`'s bytes as a buffer view, 4 byte aligned."""
+        data = numpy.ascontiguousarray(array).view(numpy.uint8).ravel()
+        view = {'buffer': 0, 'byteOffset': self.length, 'byteLength': len(data),
+                'target': target}
+        if stride is not None:
+            view['byteStride'] = stride
+        self.data.write(data.tobytes())
+        self.length += len(data)
+        padding = -self.length % 4
+        self.data.write(b'\0' * padding)
+        self.length += padding
+        self.json['bufferViews'].append(view)
+        return len(self.json['bufferViews']) - 1
+
+    def accessor(self, view, component, count, kind, **extra):
+        accessor = dict(bufferView=view, componentType=component, count=count,
+                        type=kind, **extra)
+        self.json['accessors'].append(accessor)
+        return len(self.json['accessors']) - 1
+
+    @timed('gltf export')
+    def mesh(self, name, vertices, colors, indices):
+        """Add a mesh from arrays, returning its index for `node`.
+
+        Colours are floats in [0, 1] or bytes, written as normalised bytes
+        with an opaque alpha.
+        """
+        positions = to_gltf(vertices).astype(numpy.float32)
+        colors = numpy.asarray(colors)
+        if numpy.issubdtype(colors.dtype, numpy.floating):
+            colors = numpy.clip(colors * 255.0 + 0.5, 0, 255)
+        colors = colors.astype(numpy.uint8).reshape(-1, 4).copy()
+        colors[:, 3] = 255
+        indices = numpy.asarray(indices, dtype=numpy.uint32).ravel()
+        position = self.accessor(
+            self.view(positions, _ARRAY_BUFFER, 12), _FLOAT, len(positions), 'VEC3',
+            min=positions.min(axis=0).tolist(), max=positions.max(axis=0).tolist())
+        color = self.accessor(
+            self.view(colors, _ARRAY_BUFFER, 4), _UNSIGNED_BYTE, len(colors), 'VEC4',
+            normalized=True)
+        index = self.accessor(
+            self.view(indices, _ELEMENT_ARRAY_BUFFER), _UNSIGNED_INT, len(indices), 'SCALAR')
+        self.json['meshes'].append({'name': name, 'primitives': [{
+            'attributes': {'POSITION': position, 'COLOR_0': color},
+            'indices': index,
+            'material': 0,
+            }]})
+        count('gltf meshes')
+        return len(self.json['meshes']) - 1
+
+    def node(self, name, mesh, translation=None, scale=None):
+        """Add a root node showing `mesh`, placed in Panda3D coordinates."""
+        node = {'name': name, 'mesh': mesh}
+        if translation is not None:
+            node['translation'] = to_gltf([translation])[0].tolist()
+        if scale is not None:
+            # Scales are per axis, so only swapped between y and z
+            node['scale'] = [float(scale[0]), float(scale[2]), float(scale[1])]
+        self.json['nodes'].append(node)
+        self.json['scenes'][0]['nodes'].append(len(self.json['nodes']) - 1)
+
+    def close(self):
+        self.json['buffers'] = [{'byteLength': self.length}] if self.length else []
+        if not self.length:
+            del self.json['bufferViews'], self.json['accessors']
+        text = json.dumps(self.json, separators=(',', ':')).encode('utf-8')
+        text += b' ' * (-len(text) % 4)
+        total = 12 + 8 + len(text) + (8 + self.length if self.length else 0)
+        with open(self.path, 'wb') as f:
+            f.write(struct.pack('<4sII', b'glTF', 2, total))
+            f.write(struct.pack('<I4s', len(text), b'JSON'))
+            f.write(text)
+            if self.length:
+                f.write(struct.pack('<I4s', self.length, b'BIN\0'))
+                self.data.seek(0)
+                shutil.copyfileobj(self.data, f, 1 << 20)
+        self.data.close()
+
+
+def export_world(world, path, size=1280, batch=4096, pipeline=None):
+    """Write the terrain, roads and buildings of a generated world to `path`.
+
+    The terrain is exported as the viewer's chunks of `size` metres over the
+    world's heightfield, the roads in meshes of `batch` edges and the
+    buildings as one mesh per archetype with a node per building, each
+    generated and written one at a time. With a Pipeline, the terrain
+    chunks are generated on its pool and written as they come. Only the
+    world's tables are used, so `world` can be generated without meshes.
+    """
+    heightfield = world.heightfield
+    # As in TerrainChunks, so chunk grids line up with the heightfield's
+    if int(size) % int(heightfield.resolution):
+        raise ValueError('chunk size must be a multiple of the resolution')
+    with GlbWriter(path) as writer:
+        # Terrain, the chunks reaching within the heightfield's disc
+        r = heightfield.diameter / 2.0
+        n = int(-(-r // size))
+        keys = [(i, j) for i in range(-n, n) for j in range(-n, n)
+                if hypot(max(i * size, 0, -(i + 1) * size),
+                         max(j * size, 0, -(j + 1) * size)) <= r]
+        if pipeline is None:
+            tiles = (chunk(world.seed, size, heightfield.resolution, key) for key in keys)
+        else:
+            tiles = pipeline.chunks(world.seed, size, heightfield.resolution, keys)
+        for key, (field, mesh) in zip(keys, tiles):
+            name = 'TerrainChunk%d_%d' % key
+            writer.node(name, writer.mesh(name, *mesh))
+        # Roads
+        points, edges = world.points, world.edges
+        for k in range(0, len(edges), batch):
+            e = edges[k:k + batch]
+            mesh = road_mesh(points[e[:, 0]], points[e[:, 1]], heightfield)
+            name = 'Roads%d' % (k // batch)
+            writer.node(name, writer.mesh(name, *mesh))
+        # Buildings, instancing one mesh per archetype
+        archetypes = Archetypes()
+        meshes = {}
+        for k, (footprint, levels, taper) in enumerate(zip(
+                world.footprints.tolist(), world.levels.tolist(), world.tapers.tolist())):
+            origin, extent, shape = archetypes.shape([Vec3(*c) for c in footprint])
+            key = (shape, levels, taper)
+            if key not in meshes:
+                building = Building(border=[Vec3(*c) for c in shape],
+                                    tops=[i * 2.5 for i in range(levels)], taper=taper)
+                meshes[key] = writer.mesh('Building%d' % len(meshes), *building.arrays())
+            writer.node('Building%d' % k, meshes[key],
+                        translation=(origin.x, origin.y, origin.z),
+                        scale=(extent, extent, 1.0))
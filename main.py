@@ -1,47 +1,54 @@
-from math import pi, sin, cos
-from random import random
+import argparse
+import threading
+from functools import partial
+from math import pi, sin, cos, radians, tan
 
+from direct.gui.OnscreenText import OnscreenText
 from direct.showbase.ShowBase import ShowBase
 from direct.task import Task
-from panda3d.core import Vec3, Fog
+from panda3d.core import Vec3, Fog, TextNode
 
-from buildings import Building
-from terrain import Terrain, Landmarks, elevation, random_in_circle
+import geometry
+import noise_backends
+import profiling
+from cache import WorldCache
+from chunks import TerrainChunks
+from pipeline import Pipeline
+from progressive import Progressive
+from quadtree import QuadtreeTerrain
 from utils import prod
+from world import World
 
 
 class MyApp(ShowBase):
 
-    def __init__(self):
+    def __init__(self, quadtree=False):
         ShowBase.__init__(self)
         self.setBackgroundColor(0.8, 0.8, 0.8)
         fog = Fog("Fog Name")
         fog.setColor(0.6, 0.6, 0.6)
         fog.setExpDensity(0.001)
         self.render.setFog(fog)
-        # Terrain
-        terarin = Terrain()
-        nodePath = self.render.attachNewNode(terarin.node())
-        # Landmarks
-        landmarks = Landmarks(8000, 2.5/1000000)
-        nodePath = self.render.attachNewNode(landmarks.node())
-        nodePath.setRenderModeThickness(1)
-        # Box
-        for i in range(50):
-            x, y = random_in_circle()
-            x *= 5000
-            y *= 5000
-            z = elevation(x, y) - 10
-            border = (
-                Vec3(x, y, z),
-                Vec3(x, y + 50.0, z),
-                Vec3(x + 50.0, y + 50.0, z),
-                Vec3(x + 50.0, y, z),
-                )
-            tops = [i * 2.5 for i in range(int(40 + random() * 60))]
-            building = Building(border=border, tops=tops)
-            nodePath = self.render.attachNewNode(building.node())
-            nodePath.setTwoSided(True)
+        # World, generated in the background and attached as it comes
+        self.world = World()
+        self.world.seed_noise()
+        # Pick (and compile) the noise backend here, as loading compiled code
+        # on the generation thread would hold up frames
+        noise_backends.current()
+        if quadtree:
+            # Pixels per metre at one metre from the camera, for the error
+            projection = 800.0
+            if self.win is not None:
+                fov = self.camLens.getFov()[1]
+                projection = self.win.getYSize() / (2 * tan(radians(fov) / 2))
+            self.terrain = QuadtreeTerrain(self.render, projection=projection,
+                                           seed=self.world.seed)
+            self.limit = 8
+        else:
+            self.terrain = TerrainChunks(self.render, seed=self.world.seed)
+            self.limit = 1
+        self.progressive = Progressive(self.generate()).start()
+        self.taskMgr.add(self.progressive.task, "GenerationTask")
         self.disableMouse()
         self.taskMgr.add(self.camera_task, "CameraTask")
         self.height = 100
@@ -53,6 +60,9 @@ class MyApp(ShowBase):
         # self.accept('d', self.right)
         self.position = Vec3(0.0, 0.0, 0.0)
         self.movement = Vec3(0.0, 0.0, 2.0)
+        # Generation profile overlay
+        self.profile = None
+        self.accept('f3', self.toggle_profile)
 
     def camera_task(self, task):
         if self.mouseWatcherNode.hasMouse():
@@ -61,13 +71,55 @@ class MyApp(ShowBase):
             orientation = self.render.getRelativeVector(self.camera, Vec3.forward())
             self.position.x += orientation.x * self.movement.y
             self.position.y += orientation.y * self.movement.y
-            self.position.z = self.movement.z + elevation(self.position.x, self.position.y)
+            self.position.z = self.movement.z + self.terrain.sample(
+                self.position.x, self.position.y)
             self.movement.x = 0
             self.movement.y = 0
             self.camera.setPos(self.position)
             self.camera.setHpr(-x * 180, y * 90, 0)
+        if self.progressive.finished:
+            self.terrain.update(self.position, limit=self.limit)
         return Task.cont
 
+    def generate(self):
+        # Runs on a background thread, see Progressive
+        with Pipeline() as pipeline:
+            # Terrain
+            keys = self.terrain.wanted(0.0, 0.0)
+            for key, heightfield, mesh in self.terrain.build_many(keys, pipeline):
+                yield partial(self.terrain.attach, key, heightfield, mesh)
+            # World
+            cache = WorldCache()
+            if cache.load(self.world):
+                yield partial(self.world.roads.reparentTo, self.render)
+                yield partial(self.world.buildings.reparentTo, self.render)
+                return
+            yield partial(self.world.roads.reparentTo, self.render)
+            yield partial(self.world.buildings.reparentTo, self.render)
+            for parent, nodePath in self.world.pieces(pipeline):
+                yield partial(nodePath.reparentTo, parent)
+        # Write the cache here rather than from the main loop, once the main
+        # loop has attached every piece, so the writes don't hold up frames
+        attached = threading.Event()
+        yield attached.set
+        attached.wait()
+        cache.save(self.world)
+
+    def toggle_profile(self):
+        if self.profile is None:
+            self.profile = OnscreenText(
+                pos=(-1.3, 0.9), scale=0.04, align=TextNode.ALeft, mayChange=True,
+                font=self.loader.loadFont('cmtt12'))
+            self.taskMgr.doMethodLater(0.5, self.profile_task, "ProfileTask")
+        else:
+            self.taskMgr.remove("ProfileTask")
+            self.profile.destroy()
+            self.profile = None
+
+    def profile_task(self, task):
+        self.profile.setText(profiling.text())
+        return Task.again
+
     def wheel_up(self):
         self.movement.z += 1
 
@@ -87,4 +139,12 @@ class MyApp(ShowBase):
     #     self.rotation.y = -1
 
 
-MyApp().run()
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='City viewer')
+    parser.add_argument('--quadtree', action='store_true',
+                        help='refine the terrain around the camera')
+    parser.add_argument('--compact', action='store_true',
+                        help='store vertex positions as 16 bit integers')
+    args = parser.parse_args()
+    geometry.QUANTIZE = args.compact
+    MyApp(quadtree=args.quadtree).run()
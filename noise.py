@@ -36,9 +36,21 @@ number  as the parameter for the noise, all objects will end up with the same
 noise value  at each frame. By adding a second parameter on the second
 dimension, you can ensure that each gets a unique noise value and they don't
 all look identical.
+
+Every function has an "_array" counterpart which takes NumPy arrays (of any
+broadcastable shape) instead of scalars and returns an array of the same
+shape. They perform the same floating point operations in the same order, so
+their results are bit-for-bit identical to the scalar functions.
+
+The 2D and 3D raw and multi-octave functions also have "_grad" variants
+returning the noise value together with its analytic partial derivatives,
+computed in the same pass. The value is the same as the plain function's.
 """
 
 import math
+import random
+
+import numpy
 
 def octave_noise_2d(octaves, persistence, scale, x, y):
     """2D Multi-Octave Simplex noise.
@@ -177,8 +189,8 @@ def raw_noise_2d(x, y):
     F2 = 0.5 * (math.sqrt(3.0) - 1.0)
     # Hairy skew factor for 2D
     s = (x + y) * F2
-    i = int(x + s)
-    j = int(y + s)
+    i = math.floor(x + s)
+    j = math.floor(y + s)
 
     G2 = (3.0 - math.sqrt(3.0)) / 6.0
     t = float(i + j) * G2
@@ -249,9 +261,9 @@ def raw_noise_3d(x, y, z):
     F3 = 1.0/3.0
     # Very nice and simple skew factor for 3D
     s = (x+y+z) * F3
-    i = int(x + s)
-    j = int(y + s)
-    k = int(z + s)
+    i = math.floor(x + s)
+    j = math.floor(y + s)
+    k = math.floor(z + s)
 
     G3 = 1.0 / 6.0
     t = float(i+j+k) * G3
@@ -379,10 +391,10 @@ def raw_noise_4d(x, y, z, w):
     F4 = (math.sqrt(5.0)-1.0) / 4.0
     # Skew the (x,y,z,w) space to determine which cell of 24 simplices we're in
     s = (x + y + z + w) * F4
-    i = int(x + s)
-    j = int(y + s)
-    k = int(z + s)
-    l = int(w + s)
+    i = math.floor(x + s)
+    j = math.floor(y + s)
+    k = math.floor(z + s)
+    l = math.floor(w + s)
 
     G4 = (5.0-math.sqrt(5.0)) / 20.0
     t = (i + j + k + l) * G4
@@ -574,3 +586,546 @@ _simplex = [
     [2,0,1,3],[0,0,0,0],[0,0,0,0],[0,0,0,0],[3,0,1,2],[3,0,2,1],[0,0,0,0],[3,1,2,0],
     [2,1,0,3],[0,0,0,0],[0,0,0,0],[0,0,0,0],[3,1,0,2],[0,0,0,0],[3,2,0,1],[3,2,1,0]
 ]
+
+
+"""Array versions of the tables above."""
+_grad3_array = numpy.array(_grad3, dtype=numpy.int64)
+_grad4_array = numpy.array(_grad4, dtype=numpy.int64)
+_perm_array = numpy.array(_perm, dtype=numpy.int64)
+_simplex_array = numpy.array(_simplex, dtype=numpy.int64)
+
+"""The original permutation, restored by seed(None)."""
+_perm_default = list(_perm)
+_seed = None
+
+
+def seed(value):
+    """Derive the permutation table from `value`.
+
+    The same value always gives the same table, so noise is reproducible
+    across runs and processes. None restores the original table.
+    """
+    global _perm_array, _seed
+    _seed = value
+    if value is None:
+        table = _perm_default[:256]
+    else:
+        table = list(range(256))
+        random.Random(value).shuffle(table)
+    _perm[:] = table + table
+    _perm_array = numpy.array(_perm, dtype=numpy.int64)
+
+
+def current_seed():
+    """The value last passed to seed()."""
+    return _seed
+
+
+def octave_noise_2d_array(octaves, persistence, scale, x, y):
+    """2D Multi-Octave Simplex noise over arrays of coordinates."""
+    x = numpy.asarray(x, dtype=numpy.float64)
+    y = numpy.asarray(y, dtype=numpy.float64)
+    total = 0.0
+    frequency = scale
+    amplitude = 1.0
+    maxAmplitude = 0.0
+    for i in range(octaves):
+        total = total + raw_noise_2d_array(x * frequency,
+                                           y * frequency) * amplitude
+        frequency *= 2.0
+        maxAmplitude += amplitude
+        amplitude *= persistence
+    return total / maxAmplitude
+
+def octave_noise_3d_array(octaves, persistence, scale, x, y, z):
+    """3D Multi-Octave Simplex noise over arrays of coordinates."""
+    x = numpy.asarray(x, dtype=numpy.float64)
+    y = numpy.asarray(y, dtype=numpy.float64)
+    z = numpy.asarray(z, dtype=numpy.float64)
+    total = 0.0
+    frequency = scale
+    amplitude = 1.0
+    maxAmplitude = 0.0
+    for i in range(octaves):
+        total = total + raw_noise_3d_array(x * frequency,
+                                           y * frequency,
+                                           z * frequency) * amplitude
+        frequency *= 2.0
+        maxAmplitude += amplitude
+        amplitude *= persistence
+    return total / maxAmplitude
+
+def octave_noise_4d_array(octaves, persistence, scale, x, y, z, w):
+    """4D Multi-Octave Simplex noise over arrays of coordinates."""
+    x = numpy.asarray(x, dtype=numpy.float64)
+    y = numpy.asarray(y, dtype=numpy.float64)
+    z = numpy.asarray(z, dtype=numpy.float64)
+    w = numpy.asarray(w, dtype=numpy.float64)
+    total = 0.0
+    frequency = scale
+    amplitude = 1.0
+    maxAmplitude = 0.0
+    for i in range(octaves):
+        total = total + raw_noise_4d_array(x * frequency,
+                                           y * frequency,
+                                           z * frequency,
+                                           w * frequency) * amplitude
+        frequency *= 2.0
+        maxAmplitude += amplitude
+        amplitude *= persistence
+    return total / maxAmplitude
+
+def scaled_octave_noise_2d_array(octaves, persistence, scale, loBound, hiBound, x, y):
+    """2D Scaled Multi-Octave Simplex noise over arrays of coordinates."""
+    return  (octave_noise_2d_array(octaves, persistence, scale, x, y) *
+            (hiBound - loBound) / 2 +
+            (hiBound + loBound) / 2)
+
+def scaled_octave_noise_3d_array(octaves, persistence, scale, loBound, hiBound, x, y, z):
+    """3D Scaled Multi-Octave Simplex noise over arrays of coordinates."""
+    return  (octave_noise_3d_array(octaves, persistence, scale, x, y, z) *
+            (hiBound - loBound) / 2 +
+            (hiBound + loBound) / 2)
+
+def scaled_octave_noise_4d_array(octaves, persistence, scale, loBound, hiBound, x, y, z, w):
+    """4D Scaled Multi-Octave Simplex noise over arrays of coordinates."""
+    return  (octave_noise_4d_array(octaves, persistence, scale, x, y, z, w) *
+            (hiBound - loBound) / 2 +
+            (hiBound + loBound) / 2)
+
+def raw_noise_2d_array(x, y):
+    """2D Raw Simplex noise over arrays of coordinates."""
+    x, y = numpy.broadcast_arrays(numpy.asarray(x, dtype=numpy.float64),
+                                  numpy.asarray(y, dtype=numpy.float64))
+
+    F2 = 0.5 * (math.sqrt(3.0) - 1.0)
+    s = (x + y) * F2
+    i = numpy.floor(x + s)
+    j = numpy.floor(y + s)
+
+    G2 = (3.0 - math.sqrt(3.0)) / 6.0
+    t = (i + j) * G2
+    X0 = i - t
+    Y0 = j - t
+    x0 = x - X0
+    y0 = y - Y0
+
+    i1 = (x0 > y0).astype(numpy.int64)
+    j1 = 1 - i1
+
+    x1 = x0 - i1 + G2
+    y1 = y0 - j1 + G2
+    x2 = x0 - 1.0 + 2.0 * G2
+    y2 = y0 - 1.0 + 2.0 * G2
+
+    ii = i.astype(numpy.int64) & 255
+    jj = j.astype(numpy.int64) & 255
+    gi0 = _perm_array[ii+_perm_array[jj]] % 12
+    gi1 = _perm_array[ii+i1+_perm_array[jj+j1]] % 12
+    gi2 = _perm_array[ii+1+_perm_array[jj+1]] % 12
+
+    n0 = _corner_array(0.5 - x0*x0 - y0*y0, _grad3_array[gi0], x0, y0)
+    n1 = _corner_array(0.5 - x1*x1 - y1*y1, _grad3_array[gi1], x1, y1)
+    n2 = _corner_array(0.5 - x2*x2 - y2*y2, _grad3_array[gi2], x2, y2)
+
+    return 70.0 * (n0 + n1 + n2)
+
+def raw_noise_3d_array(x, y, z):
+    """3D Raw Simplex noise over arrays of coordinates."""
+    x, y, z = numpy.broadcast_arrays(numpy.asarray(x, dtype=numpy.float64),
+                                     numpy.asarray(y, dtype=numpy.float64),
+                                     numpy.asarray(z, dtype=numpy.float64))
+
+    F3 = 1.0/3.0
+    s = (x+y+z) * F3
+    i = numpy.floor(x + s)
+    j = numpy.floor(y + s)
+    k = numpy.floor(z + s)
+
+    G3 = 1.0 / 6.0
+    t = (i+j+k) * G3
+    X0 = i - t
+    Y0 = j - t
+    Z0 = k - t
+    x0 = x - X0
+    y0 = y - Y0
+    z0 = z - Z0
+
+    # The branches of the scalar version, as masks over the six orderings.
+    xy = x0 >= y0
+    yz = y0 >= z0
+    xz = x0 >= z0
+    xyz = xy & yz            # X Y Z order
+    xzy = xy & ~yz & xz      # X Z Y order
+    zxy = xy & ~yz & ~xz     # Z X Y order
+    zyx = ~xy & ~yz          # Z Y X order
+    yzx = ~xy & yz & ~xz     # Y Z X order
+    yxz = ~xy & yz & xz      # Y X Z order
+    i1 = (xyz | xzy).astype(numpy.int64)
+    j1 = (yzx | yxz).astype(numpy.int64)
+    k1 = (zxy | zyx).astype(numpy.int64)
+    i2 = (xyz | xzy | zxy | yxz).astype(numpy.int64)
+    j2 = (xyz | zyx | yzx | yxz).astype(numpy.int64)
+    k2 = (xzy | zxy | zyx | yzx).astype(numpy.int64)
+
+    x1 = x0 - i1 + G3
+    y1 = y0 - j1 + G3
+    z1 = z0 - k1 + G3
+    x2 = x0 - i2 + 2.0*G3
+    y2 = y0 - j2 + 2.0*G3
+    z2 = z0 - k2 + 2.0*G3
+    x3 = x0 - 1.0 + 3.0*G3
+    y3 = y0 - 1.0 + 3.0*G3
+    z3 = z0 - 1.0 + 3.0*G3
+
+    ii = i.astype(numpy.int64) & 255
+    jj = j.astype(numpy.int64) & 255
+    kk = k.astype(numpy.int64) & 255
+    p = _perm_array
+    gi0 = p[ii+p[jj+p[kk]]] % 12
+    gi1 = p[ii+i1+p[jj+j1+p[kk+k1]]] % 12
+    gi2 = p[ii+i2+p[jj+j2+p[kk+k2]]] % 12
+    gi3 = p[ii+1+p[jj+1+p[kk+1]]] % 12
+
+    n0 = _corner_array(0.6 - x0*x0 - y0*y0 - z0*z0, _grad3_array[gi0], x0, y0, z0)
+    n1 = _corner_array(0.6 - x1*x1 - y1*y1 - z1*z1, _grad3_array[gi1], x1, y1, z1)
+    n2 = _corner_array(0.6 - x2*x2 - y2*y2 - z2*z2, _grad3_array[gi2], x2, y2, z2)
+    n3 = _corner_array(0.6 - x3*x3 - y3*y3 - z3*z3, _grad3_array[gi3], x3, y3, z3)
+
+    return 32.0 * (n0 + n1 + n2 + n3)
+
+def raw_noise_4d_array(x, y, z, w):
+    """4D Raw Simplex noise over arrays of coordinates."""
+    x, y, z, w = numpy.broadcast_arrays(numpy.asarray(x, dtype=numpy.float64),
+                                        numpy.asarray(y, dtype=numpy.float64),
+                                        numpy.asarray(z, dtype=numpy.float64),
+                                        numpy.asarray(w, dtype=numpy.float64))
+
+    F4 = (math.sqrt(5.0)-1.0) / 4.0
+    s = (x + y + z + w) * F4
+    i = numpy.floor(x + s)
+    j = numpy.floor(y + s)
+    k = numpy.floor(z + s)
+    l = numpy.floor(w + s)
+
+    G4 = (5.0-math.sqrt(5.0)) / 20.0
+    t = (i + j + k + l) * G4
+    X0 = i - t
+    Y0 = j - t
+    Z0 = k - t
+    W0 = l - t
+    x0 = x - X0
+    y0 = y - Y0
+    z0 = z - Z0
+    w0 = w - W0
+
+    c = (32 * (x0 > y0) + 16 * (x0 > z0) + 8 * (y0 > z0) +
+         4 * (x0 > w0) + 2 * (y0 > w0) + (z0 > w0))
+    simplex = _simplex_array[c]
+    i1 = (simplex[..., 0] >= 3).astype(numpy.int64)
+    j1 = (simplex[..., 1] >= 3).astype(numpy.int64)
+    k1 = (simplex[..., 2] >= 3).astype(numpy.int64)
+    l1 = (simplex[..., 3] >= 3).astype(numpy.int64)
+    i2 = (simplex[..., 0] >= 2).astype(numpy.int64)
+    j2 = (simplex[..., 1] >= 2).astype(numpy.int64)
+    k2 = (simplex[..., 2] >= 2).astype(numpy.int64)
+    l2 = (simplex[..., 3] >= 2).astype(numpy.int64)
+    i3 = (simplex[..., 0] >= 1).astype(numpy.int64)
+    j3 = (simplex[..., 1] >= 1).astype(numpy.int64)
+    k3 = (simplex[..., 2] >= 1).astype(numpy.int64)
+    l3 = (simplex[..., 3] >= 1).astype(numpy.int64)
+
+    x1 = x0 - i1 + G4
+    y1 = y0 - j1 + G4
+    z1 = z0 - k1 + G4
+    w1 = w0 - l1 + G4
+    x2 = x0 - i2 + 2.0*G4
+    y2 = y0 - j2 + 2.0*G4
+    z2 = z0 - k2 + 2.0*G4
+    w2 = w0 - l2 + 2.0*G4
+    x3 = x0 - i3 + 3.0*G4
+    y3 = y0 - j3 + 3.0*G4
+    z3 = z0 - k3 + 3.0*G4
+    w3 = w0 - l3 + 3.0*G4
+    x4 = x0 - 1.0 + 4.0*G4
+    y4 = y0 - 1.0 + 4.0*G4
+    z4 = z0 - 1.0 + 4.0*G4
+    w4 = w0 - 1.0 + 4.0*G4
+
+    ii = i.astype(numpy.int64) & 255
+    jj = j.astype(numpy.int64) & 255
+    kk = k.astype(numpy.int64) & 255
+    ll = l.astype(numpy.int64) & 255
+    p = _perm_array
+    gi0 = p[ii+p[jj+p[kk+p[ll]]]] % 32
+    gi1 = p[ii+i1+p[jj+j1+p[kk+k1+p[ll+l1]]]] % 32
+    gi2 = p[ii+i2+p[jj+j2+p[kk+k2+p[ll+l2]]]] % 32
+    gi3 = p[ii+i3+p[jj+j3+p[kk+k3+p[ll+l3]]]] % 32
+    gi4 = p[ii+1+p[jj+1+p[kk+1+p[ll+1]]]] % 32
+
+    n0 = _corner_array(0.6 - x0*x0 - y0*y0 - z0*z0 - w0*w0, _grad4_array[gi0], x0, y0, z0, w0)
+    n1 = _corner_array(0.6 - x1*x1 - y1*y1 - z1*z1 - w1*w1, _grad4_array[gi1], x1, y1, z1, w1)
+    n2 = _corner_array(0.6 - x2*x2 - y2*y2 - z2*z2 - w2*w2, _grad4_array[gi2], x2, y2, z2, w2)
+    n3 = _corner_array(0.6 - x3*x3 - y3*y3 - z3*z3 - w3*w3, _grad4_array[gi3], x3, y3, z3, w3)
+    n4 = _corner_array(0.6 - x4*x4 - y4*y4 - z4*z4 - w4*w4, _grad4_array[gi4], x4, y4, z4, w4)
+
+    return 27.0 * (n0 + n1 + n2 + n3 + n4)
+
+def _corner_array(t, g, *d):
+    """Contribution of one simplex corner, zero where t < 0."""
+    dot = g[..., 0] * d[0]
+    for axis in range(1, len(d)):
+        dot = dot + g[..., axis] * d[axis]
+    t2 = t * t
+    return numpy.where(t < 0, 0.0, t2 * t2 * dot)
+
+
+def _corner_grad(t, g, *d):
+    """Contribution of one simplex corner and its partial derivatives.
+
+    With t = r - |d|^2 the contribution is t^4 (g . d), so its derivative
+    along axis a is t^4 g[a] - 8 t^3 d[a] (g . d).
+    """
+    if t < 0:
+        return (0.0,) * (len(d) + 1)
+    dot = g[0] * d[0]
+    for axis in range(1, len(d)):
+        dot += g[axis] * d[axis]
+    t2 = t * t
+    t4 = t2 * t2
+    t3 = t2 * t
+    return (t4 * dot,) + tuple(t4 * g[a] - 8.0 * t3 * d[a] * dot for a in range(len(d)))
+
+def _corner_grad_array(t, g, *d):
+    """Array version of _corner_grad."""
+    dot = g[..., 0] * d[0]
+    for axis in range(1, len(d)):
+        dot = dot + g[..., axis] * d[axis]
+    t2 = t * t
+    t4 = t2 * t2
+    t3 = t2 * t
+    inside = t >= 0
+    return (numpy.where(inside, t4 * dot, 0.0),) + tuple(
+        numpy.where(inside, t4 * g[..., a] - 8.0 * t3 * d[a] * dot, 0.0)
+        for a in range(len(d)))
+
+def raw_noise_2d_grad(x, y):
+    """2D Raw Simplex noise and its gradient, as (value, d/dx, d/dy).
+
+    The value is the same as raw_noise_2d(x, y).
+    """
+    F2 = 0.5 * (math.sqrt(3.0) - 1.0)
+    s = (x + y) * F2
+    i = math.floor(x + s)
+    j = math.floor(y + s)
+    G2 = (3.0 - math.sqrt(3.0)) / 6.0
+    t = float(i + j) * G2
+    x0 = x - (i - t)
+    y0 = y - (j - t)
+    i1, j1 = (1, 0) if x0 > y0 else (0, 1)
+    x1 = x0 - i1 + G2
+    y1 = y0 - j1 + G2
+    x2 = x0 - 1.0 + 2.0 * G2
+    y2 = y0 - 1.0 + 2.0 * G2
+    ii = int(i) & 255
+    jj = int(j) & 255
+    gi0 = _perm[ii+_perm[jj]] % 12
+    gi1 = _perm[ii+i1+_perm[jj+j1]] % 12
+    gi2 = _perm[ii+1+_perm[jj+1]] % 12
+    c0 = _corner_grad(0.5 - x0*x0 - y0*y0, _grad3[gi0], x0, y0)
+    c1 = _corner_grad(0.5 - x1*x1 - y1*y1, _grad3[gi1], x1, y1)
+    c2 = _corner_grad(0.5 - x2*x2 - y2*y2, _grad3[gi2], x2, y2)
+    return tuple(70.0 * (a + b + c) for a, b, c in zip(c0, c1, c2))
+
+def _order_3d(x0, y0, z0):
+    """Offsets of the second and third corners of the 3D simplex."""
+    if x0 >= y0:
+        if y0 >= z0:
+            return (1, 0, 0), (1, 1, 0)
+        elif x0 >= z0:
+            return (1, 0, 0), (1, 0, 1)
+        return (0, 0, 1), (1, 0, 1)
+    if y0 < z0:
+        return (0, 0, 1), (0, 1, 1)
+    elif x0 < z0:
+        return (0, 1, 0), (0, 1, 1)
+    return (0, 1, 0), (1, 1, 0)
+
+def raw_noise_3d_grad(x, y, z):
+    """3D Raw Simplex noise and its gradient, as (value, d/dx, d/dy, d/dz).
+
+    The value is the same as raw_noise_3d(x, y, z).
+    """
+    F3 = 1.0/3.0
+    s = (x+y+z) * F3
+    i = math.floor(x + s)
+    j = math.floor(y + s)
+    k = math.floor(z + s)
+    G3 = 1.0 / 6.0
+    t = float(i+j+k) * G3
+    x0 = x - (i - t)
+    y0 = y - (j - t)
+    z0 = z - (k - t)
+    (i1, j1, k1), (i2, j2, k2) = _order_3d(x0, y0, z0)
+    x1 = x0 - i1 + G3
+    y1 = y0 - j1 + G3
+    z1 = z0 - k1 + G3
+    x2 = x0 - i2 + 2.0*G3
+    y2 = y0 - j2 + 2.0*G3
+    z2 = z0 - k2 + 2.0*G3
+    x3 = x0 - 1.0 + 3.0*G3
+    y3 = y0 - 1.0 + 3.0*G3
+    z3 = z0 - 1.0 + 3.0*G3
+    ii = int(i) & 255
+    jj = int(j) & 255
+    kk = int(k) & 255
+    gi0 = _perm[ii+_perm[jj+_perm[kk]]] % 12
+    gi1 = _perm[ii+i1+_perm[jj+j1+_perm[kk+k1]]] % 12
+    gi2 = _perm[ii+i2+_perm[jj+j2+_perm[kk+k2]]] % 12
+    gi3 = _perm[ii+1+_perm[jj+1+_perm[kk+1]]] % 12
+    c0 = _corner_grad(0.6 - x0*x0 - y0*y0 - z0*z0, _grad3[gi0], x0, y0, z0)
+    c1 = _corner_grad(0.6 - x1*x1 - y1*y1 - z1*z1, _grad3[gi1], x1, y1, z1)
+    c2 = _corner_grad(0.6 - x2*x2 - y2*y2 - z2*z2, _grad3[gi2], x2, y2, z2)
+    c3 = _corner_grad(0.6 - x3*x3 - y3*y3 - z3*z3, _grad3[gi3], x3, y3, z3)
+    return tuple(32.0 * (a + b + c + d) for a, b, c, d in zip(c0, c1, c2, c3))
+
+def raw_noise_2d_grad_array(x, y):
+    """2D Raw Simplex noise and its gradient over arrays of coordinates."""
+    x, y = numpy.broadcast_arrays(numpy.asarray(x, dtype=numpy.float64),
+                                  numpy.asarray(y, dtype=numpy.float64))
+
+    F2 = 0.5 * (math.sqrt(3.0) - 1.0)
+    s = (x + y) * F2
+    i = numpy.floor(x + s)
+    j = numpy.floor(y + s)
+    G2 = (3.0 - math.sqrt(3.0)) / 6.0
+    t = (i + j) * G2
+    x0 = x - (i - t)
+    y0 = y - (j - t)
+    i1 = (x0 > y0).astype(numpy.int64)
+    j1 = 1 - i1
+    x1 = x0 - i1 + G2
+    y1 = y0 - j1 + G2
+    x2 = x0 - 1.0 + 2.0 * G2
+    y2 = y0 - 1.0 + 2.0 * G2
+    ii = i.astype(numpy.int64) & 255
+    jj = j.astype(numpy.int64) & 255
+    gi0 = _perm_array[ii+_perm_array[jj]] % 12
+    gi1 = _perm_array[ii+i1+_perm_array[jj+j1]] % 12
+    gi2 = _perm_array[ii+1+_perm_array[jj+1]] % 12
+    c0 = _corner_grad_array(0.5 - x0*x0 - y0*y0, _grad3_array[gi0], x0, y0)
+    c1 = _corner_grad_array(0.5 - x1*x1 - y1*y1, _grad3_array[gi1], x1, y1)
+    c2 = _corner_grad_array(0.5 - x2*x2 - y2*y2, _grad3_array[gi2], x2, y2)
+    return tuple(70.0 * (a + b + c) for a, b, c in zip(c0, c1, c2))
+
+def raw_noise_3d_grad_array(x, y, z):
+    """3D Raw Simplex noise and its gradient over arrays of coordinates."""
+    x, y, z = numpy.broadcast_arrays(numpy.asarray(x, dtype=numpy.float64),
+                                     numpy.asarray(y, dtype=numpy.float64),
+                                     numpy.asarray(z, dtype=numpy.float64))
+
+    F3 = 1.0/3.0
+    s = (x+y+z) * F3
+    i = numpy.floor(x + s)
+    j = numpy.floor(y + s)
+    k = numpy.floor(z + s)
+    G3 = 1.0 / 6.0
+    t = (i+j+k) * G3
+    x0 = x - (i - t)
+    y0 = y - (j - t)
+    z0 = z - (k - t)
+
+    xy = x0 >= y0
+    yz = y0 >= z0
+    xz = x0 >= z0
+    xyz = xy & yz
+    xzy = xy & ~yz & xz
+    zxy = xy & ~yz & ~xz
+    zyx = ~xy & ~yz
+    yzx = ~xy & yz & ~xz
+    yxz = ~xy & yz & xz
+    i1 = (xyz | xzy).astype(numpy.int64)
+    j1 = (yzx | yxz).astype(numpy.int64)
+    k1 = (zxy | zyx).astype(numpy.int64)
+    i2 = (xyz | xzy | zxy | yxz).astype(numpy.int64)
+    j2 = (xyz | zyx | yzx | yxz).astype(numpy.int64)
+    k2 = (xzy | zxy | zyx | yzx).astype(numpy.int64)
+
+    x1 = x0 - i1 + G3
+    y1 = y0 - j1 + G3
+    z1 = z0 - k1 + G3
+    x2 = x0 - i2 + 2.0*G3
+    y2 = y0 - j2 + 2.0*G3
+    z2 = z0 - k2 + 2.0*G3
+    x3 = x0 - 1.0 + 3.0*G3
+    y3 = y0 - 1.0 + 3.0*G3
+    z3 = z0 - 1.0 + 3.0*G3
+
+    ii = i.astype(numpy.int64) & 255
+    jj = j.astype(numpy.int64) & 255
+    kk = k.astype(numpy.int64) & 255
+    p = _perm_array
+    gi0 = p[ii+p[jj+p[kk]]] % 12
+    gi1 = p[ii+i1+p[jj+j1+p[kk+k1]]] % 12
+    gi2 = p[ii+i2+p[jj+j2+p[kk+k2]]] % 12
+    gi3 = p[ii+1+p[jj+1+p[kk+1]]] % 12
+
+    c0 = _corner_grad_array(0.6 - x0*x0 - y0*y0 - z0*z0, _grad3_array[gi0], x0, y0, z0)
+    c1 = _corner_grad_array(0.6 - x1*x1 - y1*y1 - z1*z1, _grad3_array[gi1], x1, y1, z1)
+    c2 = _corner_grad_array(0.6 - x2*x2 - y2*y2 - z2*z2, _grad3_array[gi2], x2, y2, z2)
+    c3 = _corner_grad_array(0.6 - x3*x3 - y3*y3 - z3*z3, _grad3_array[gi3], x3, y3, z3)
+    return tuple(32.0 * (a + b + c + d) for a, b, c, d in zip(c0, c1, c2, c3))
+
+def _octave_grad(raw, octaves, persistence, scale, *coords):
+    """Multi-Octave noise and its gradient from a raw gradient function.
+
+    Each octave samples at `frequency` times the coordinates, so its
+    gradient is scaled by `frequency` on top of the amplitude.
+    """
+    total = None
+    frequency = scale
+    amplitude = 1.0
+    maxAmplitude = 0.0
+    for i in range(octaves):
+        octave = raw(*[c * frequency for c in coords])
+        octave = (octave[0] * amplitude,) + tuple(
+            d * (amplitude * frequency) for d in octave[1:])
+        total = octave if total is None else tuple(
+            a + b for a, b in zip(total, octave))
+        frequency *= 2.0
+        maxAmplitude += amplitude
+        amplitude *= persistence
+    return tuple(a / maxAmplitude for a in total)
+
+def octave_noise_2d_grad(octaves, persistence, scale, x, y):
+    """2D Multi-Octave Simplex noise and its gradient, as (value, d/dx, d/dy)."""
+    return _octave_grad(raw_noise_2d_grad, octaves, persistence, scale, x, y)
+
+def octave_noise_3d_grad(octaves, persistence, scale, x, y, z):
+    """3D Multi-Octave Simplex noise and its gradient, as (value, d/dx, d/dy, d/dz)."""
+    return _octave_grad(raw_noise_3d_grad, octaves, persistence, scale, x, y, z)
+
+def octave_noise_2d_grad_array(octaves, persistence, scale, x, y):
+    """2D Multi-Octave Simplex noise and its gradient over arrays of coordinates."""
+    x = numpy.asarray(x, dtype=numpy.float64)
+    y = numpy.asarray(y, dtype=numpy.float64)
+    return _octave_grad(raw_noise_2d_grad_array, octaves, persistence, scale, x, y)
+
+def octave_noise_3d_grad_array(octaves, persistence, scale, x, y, z):
+    """3D Multi-Octave Simplex noise and its gradient over arrays of coordinates."""
+    x = numpy.asarray(x, dtype=numpy.float64)
+    y = numpy.asarray(y, dtype=numpy.float64)
+    z = numpy.asarray(z, dtype=numpy.float64)
+    return _octave_grad(raw_noise_3d_grad_array, octaves, persistence, scale, x, y, z)
+
+def scaled_octave_noise_2d_grad(octaves, persistence, scale, loBound, hiBound, x, y):
+    """2D Scaled Multi-Octave Simplex noise and its gradient."""
+    value, dx, dy = octave_noise_2d_grad(octaves, persistence, scale, x, y)
+    half = (hiBound - loBound) / 2
+    return value * half + (hiBound + loBound) / 2, dx * half, dy * half
+
+def scaled_octave_noise_2d_grad_array(octaves, persistence, scale, loBound, hiBound, x, y):
+    """2D Scaled Multi-Octave Simplex noise and its gradient over arrays of coordinates."""
+    value, dx, dy = octave_noise_2d_grad_array(octaves, persistence, scale, x, y)
+    half = (hiBound - loBound) / 2
+    return value * half + (hiBound + loBound) / 2, dx * half, dy * half
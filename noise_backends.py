@@ -0,0 +1,435 @@
+"""Interchangeable implementations of the noise functions.
+
+Every backend evaluates raw 2D, 3D and 4D simplex noise over arrays, and
+raw 2D noise with its gradient, and Backend builds the multi-octave and
+scaled variants on top of those the same way noise.py does. Backends:
+
+    reference   the scalar functions of noise.py, one point at a time
+    numpy       the "_array" functions of noise.py
+    numba       the scalar algorithm compiled with Numba, if installed;
+                its gradients are numpy's
+
+`current()` is the backend in use: the one named by the NOISE_BACKEND
+environment variable, or else the fastest one installed as measured on
+first use. `check()` compares a backend with the reference.
+All of them read the permutation table at call time, so noise.seed()
+applies to every backend. The terrain's elevation goes through current()
+for single points as well as for arrays, and so do its gradients.
+
+    python -m noise_backends
+"""
+
+import math
+import os
+import sys
+import time
+
+import numpy
+
+import noise
+
+
+class Backend:
+
+    def __init__(self, name, raw_noise_2d, raw_noise_3d, raw_noise_4d,
+                 raw_noise_2d_grad=noise.raw_noise_2d_grad_array):
+        self.name = name
+        self.raw_noise_2d = raw_noise_2d
+        self.raw_noise_3d = raw_noise_3d
+        self.raw_noise_4d = raw_noise_4d
+        self.raw_noise_2d_grad = raw_noise_2d_grad
+
+    def octave_noise_2d(self, octaves, persistence, scale, x, y):
+        return self._octave(self.raw_noise_2d, octaves, persistence, scale, x, y)
+
+    def octave_noise_3d(self, octaves, persistence, scale, x, y, z):
+        return self._octave(self.raw_noise_3d, octaves, persistence, scale, x, y, z)
+
+    def octave_noise_4d(self, octaves, persistence, scale, x, y, z, w):
+        return self._octave(self.raw_noise_4d, octaves, persistence, scale, x, y, z, w)
+
+    def scaled_octave_noise_2d(self, octaves, persistence, scale, loBound, hiBound, x, y):
+        return  (self.octave_noise_2d(octaves, persistence, scale, x, y) *
+                (hiBound - loBound) / 2 +
+                (hiBound + loBound) / 2)
+
+    def scaled_octave_noise_2d_grad(self, octaves, persistence, scale, loBound, hiBound, x, y):
+        # As noise.scaled_octave_noise_2d_grad_array
+        x = numpy.asarray(x, dtype=numpy.float64)
+        y = numpy.asarray(y, dtype=numpy.float64)
+        value, dx, dy = noise._octave_grad(
+            self.raw_noise_2d_grad, octaves, persistence, scale, x, y)
+        half = (hiBound - loBound) / 2
+        return value * half + (hiBound + loBound) / 2, dx * half, dy * half
+
+    def _octave(self, raw, octaves, persistence, scale, *coords):
+        # Same operations in the same order as noise.octave_noise_2d_array
+        coords = [numpy.asarray(c, dtype=numpy.float64) for c in coords]
+        total = 0.0
+        frequency = scale
+        amplitude = 1.0
+        maxAmplitude = 0.0
+        for i in range(octaves):
+            total = total + raw(*[c * frequency for c in coords]) * amplitude
+            frequency *= 2.0
+            maxAmplitude += amplitude
+            amplitude *= persistence
+        return total / maxAmplitude
+
+
+def _reference():
+    def vectorize(function, n, outputs=1):
+        ufunc = numpy.frompyfunc(function, n, outputs)
+
+        def run(*coords):
+            out = ufunc(*[numpy.asarray(c, dtype=numpy.float64) for c in coords])
+            if outputs == 1:
+                return numpy.asarray(out, dtype=numpy.float64)
+            return tuple(numpy.asarray(o, dtype=numpy.float64) for o in out)
+        return run
+    return Backend('reference', vectorize(noise.raw_noise_2d, 2),
+                   vectorize(noise.raw_noise_3d, 3), vectorize(noise.raw_noise_4d, 4),
+                   vectorize(noise.raw_noise_2d_grad, 2, 3))
+
+
+def _numpy():
+    return Backend('numpy', noise.raw_noise_2d_array, noise.raw_noise_3d_array,
+                   noise.raw_noise_4d_array, noise.raw_noise_2d_grad_array)
+
+
+def _raw_2d_kernel(x, y, perm, grad3, out):
+    F2 = 0.5 * (math.sqrt(3.0) - 1.0)
+    G2 = (3.0 - math.sqrt(3.0)) / 6.0
+    for k in range(x.shape[0]):
+        s = (x[k] + y[k]) * F2
+        i = math.floor(x[k] + s)
+        j = math.floor(y[k] + s)
+        t = float(i + j) * G2
+        x0 = x[k] - (i - t)
+        y0 = y[k] - (j - t)
+        if x0 > y0:
+            i1, j1 = 1, 0
+        else:
+            i1, j1 = 0, 1
+        x1 = x0 - i1 + G2
+        y1 = y0 - j1 + G2
+        x2 = x0 - 1.0 + 2.0 * G2
+        y2 = y0 - 1.0 + 2.0 * G2
+        ii = i & 255
+        jj = j & 255
+        gi0 = perm[ii+perm[jj]] % 12
+        gi1 = perm[ii+i1+perm[jj+j1]] % 12
+        gi2 = perm[ii+1+perm[jj+1]] % 12
+        n0 = 0.0
+        t0 = 0.5 - x0*x0 - y0*y0
+        if t0 >= 0:
+            t0 *= t0
+            n0 = t0 * t0 * (grad3[gi0, 0]*x0 + grad3[gi0, 1]*y0)
+        n1 = 0.0
+        t1 = 0.5 - x1*x1 - y1*y1
+        if t1 >= 0:
+            t1 *= t1
+            n1 = t1 * t1 * (grad3[gi1, 0]*x1 + grad3[gi1, 1]*y1)
+        n2 = 0.0
+        t2 = 0.5 - x2*x2 - y2*y2
+        if t2 >= 0:
+            t2 *= t2
+            n2 = t2 * t2 * (grad3[gi2, 0]*x2 + grad3[gi2, 1]*y2)
+        out[k] = 70.0 * (n0 + n1 + n2)
+
+
+def _raw_3d_kernel(x, y, z, perm, grad3, out):
+    F3 = 1.0/3.0
+    G3 = 1.0 / 6.0
+    for k in range(x.shape[0]):
+        s = (x[k]+y[k]+z[k]) * F3
+        i = math.floor(x[k] + s)
+        j = math.floor(y[k] + s)
+        l = math.floor(z[k] + s)
+        t = float(i+j+l) * G3
+        x0 = x[k] - (i - t)
+        y0 = y[k] - (j - t)
+        z0 = z[k] - (l - t)
+        if x0 >= y0:
+            if y0 >= z0:
+                i1, j1, k1, i2, j2, k2 = 1, 0, 0, 1, 1, 0
+            elif x0 >= z0:
+                i1, j1, k1, i2, j2, k2 = 1, 0, 0, 1, 0, 1
+            else:
+                i1, j1, k1, i2, j2, k2 = 0, 0, 1, 1, 0, 1
+        else:
+            if y0 < z0:
+                i1, j1, k1, i2, j2, k2 = 0, 0, 1, 0, 1, 1
+            elif x0 < z0:
+                i1, j1, k1, i2, j2, k2 = 0, 1, 0, 0, 1, 1
+            else:
+                i1, j1, k1, i2, j2, k2 = 0, 1, 0, 1, 1, 0
+        x1 = x0 - i1 + G3
+        y1 = y0 - j1 + G3
+        z1 = z0 - k1 + G3
+        x2 = x0 - i2 + 2.0*G3
+        y2 = y0 - j2 + 2.0*G3
+        z2 = z0 - k2 + 2.0*G3
+        x3 = x0 - 1.0 + 3.0*G3
+        y3 = y0 - 1.0 + 3.0*G3
+        z3 = z0 - 1.0 + 3.0*G3
+        ii = i & 255
+        jj = j & 255
+        ll = l & 255
+        gi0 = perm[ii+perm[jj+perm[ll]]] % 12
+        gi1 = perm[ii+i1+perm[jj+j1+perm[ll+k1]]] % 12
+        gi2 = perm[ii+i2+perm[jj+j2+perm[ll+k2]]] % 12
+        gi3 = perm[ii+1+perm[jj+1+perm[ll+1]]] % 12
+        t0 = 0.6 - x0*x0 - y0*y0 - z0*z0
+        n0 = 0.0
+        if t0 >= 0:
+            t0 *= t0
+            n0 = t0 * t0 * (grad3[gi0, 0]*x0 + grad3[gi0, 1]*y0 + grad3[gi0, 2]*z0)
+        t1 = 0.6 - x1*x1 - y1*y1 - z1*z1
+        n1 = 0.0
+        if t1 >= 0:
+            t1 *= t1
+            n1 = t1 * t1 * (grad3[gi1, 0]*x1 + grad3[gi1, 1]*y1 + grad3[gi1, 2]*z1)
+        t2 = 0.6 - x2*x2 - y2*y2 - z2*z2
+        n2 = 0.0
+        if t2 >= 0:
+            t2 *= t2
+            n2 = t2 * t2 * (grad3[gi2, 0]*x2 + grad3[gi2, 1]*y2 + grad3[gi2, 2]*z2)
+        t3 = 0.6 - x3*x3 - y3*y3 - z3*z3
+        n3 = 0.0
+        if t3 >= 0:
+            t3 *= t3
+            n3 = t3 * t3 * (grad3[gi3, 0]*x3 + grad3[gi3, 1]*y3 + grad3[gi3, 2]*z3)
+        out[k] = 32.0 * (n0 + n1 + n2 + n3)
+
+
+def _raw_4d_kernel(x, y, z, w, perm, grad4, simplex, out):
+    F4 = (math.sqrt(5.0)-1.0) / 4.0
+    G4 = (5.0-math.sqrt(5.0)) / 20.0
+    for m in range(x.shape[0]):
+        s = (x[m] + y[m] + z[m] + w[m]) * F4
+        i = math.floor(x[m] + s)
+        j = math.floor(y[m] + s)
+        k = math.floor(z[m] + s)
+        l = math.floor(w[m] + s)
+        t = float(i + j + k + l) * G4
+        x0 = x[m] - (i - t)
+        y0 = y[m] - (j - t)
+        z0 = z[m] - (k - t)
+        w0 = w[m] - (l - t)
+        c = ((32 if x0 > y0 else 0) + (16 if x0 > z0 else 0) +
+             (8 if y0 > z0 else 0) + (4 if x0 > w0 else 0) +
+             (2 if y0 > w0 else 0) + (1 if z0 > w0 else 0))
+        i1 = 1 if simplex[c, 0] >= 3 else 0
+        j1 = 1 if simplex[c, 1] >= 3 else 0
+        k1 = 1 if simplex[c, 2] >= 3 else 0
+        l1 = 1 if simplex[c, 3] >= 3 else 0
+        i2 = 1 if simplex[c, 0] >= 2 else 0
+        j2 = 1 if simplex[c, 1] >= 2 else 0
+        k2 = 1 if simplex[c, 2] >= 2 else 0
+        l2 = 1 if simplex[c, 3] >= 2 else 0
+        i3 = 1 if simplex[c, 0] >= 1 else 0
+        j3 = 1 if simplex[c, 1] >= 1 else 0
+        k3 = 1 if simplex[c, 2] >= 1 else 0
+        l3 = 1 if simplex[c, 3] >= 1 else 0
+        x1 = x0 - i1 + G4
+        y1 = y0 - j1 + G4
+        z1 = z0 - k1 + G4
+        w1 = w0 - l1 + G4
+        x2 = x0 - i2 + 2.0*G4
+        y2 = y0 - j2 + 2.0*G4
+        z2 = z0 - k2 + 2.0*G4
+        w2 = w0 - l2 + 2.0*G4
+        x3 = x0 - i3 + 3.0*G4
+        y3 = y0 - j3 + 3.0*G4
+        z3 = z0 - k3 + 3.0*G4
+        w3 = w0 - l3 + 3.0*G4
+        x4 = x0 - 1.0 + 4.0*G4
+        y4 = y0 - 1.0 + 4.0*G4
+        z4 = z0 - 1.0 + 4.0*G4
+        w4 = w0 - 1.0 + 4.0*G4
+        ii = i & 255
+        jj = j & 255
+        kk = k & 255
+        ll = l & 255
+        gi0 = perm[ii+perm[jj+perm[kk+perm[ll]]]] % 32
+        gi1 = perm[ii+i1+perm[jj+j1+perm[kk+k1+perm[ll+l1]]]] % 32
+        gi2 = perm[ii+i2+perm[jj+j2+perm[kk+k2+perm[ll+l2]]]] % 32
+        gi3 = perm[ii+i3+perm[jj+j3+perm[kk+k3+perm[ll+l3]]]] % 32
+        gi4 = perm[ii+1+perm[jj+1+perm[kk+1+perm[ll+1]]]] % 32
+        t0 = 0.6 - x0*x0 - y0*y0 - z0*z0 - w0*w0
+        n0 = 0.0
+        if t0 >= 0:
+            t0 *= t0
+            n0 = t0 * t0 * (grad4[gi0, 0]*x0 + grad4[gi0, 1]*y0 +
+                              grad4[gi0, 2]*z0 + grad4[gi0, 3]*w0)
+        t1 = 0.6 - x1*x1 - y1*y1 - z1*z1 - w1*w1
+        n1 = 0.0
+        if t1 >= 0:
+            t1 *= t1
+            n1 = t1 * t1 * (grad4[gi1, 0]*x1 + grad4[gi1, 1]*y1 +
+                              grad4[gi1, 2]*z1 + grad4[gi1, 3]*w1)
+        t2 = 0.6 - x2*x2 - y2*y2 - z2*z2 - w2*w2
+        n2 = 0.0
+        if t2 >= 0:
+            t2 *= t2
+            n2 = t2 * t2 * (grad4[gi2, 0]*x2 + grad4[gi2, 1]*y2 +
+                              grad4[gi2, 2]*z2 + grad4[gi2, 3]*w2)
+        t3 = 0.6 - x3*x3 - y3*y3 - z3*z3 - w3*w3
+        n3 = 0.0
+        if t3 >= 0:
+            t3 *= t3
+            n3 = t3 * t3 * (grad4[gi3, 0]*x3 + grad4[gi3, 1]*y3 +
+                              grad4[gi3, 2]*z3 + grad4[gi3, 3]*w3)
+        t4 = 0.6 - x4*x4 - y4*y4 - z4*z4 - w4*w4
+        n4 = 0.0
+        if t4 >= 0:
+            t4 *= t4
+            n4 = t4 * t4 * (grad4[gi4, 0]*x4 + grad4[gi4, 1]*y4 +
+                              grad4[gi4, 2]*z4 + grad4[gi4, 3]*w4)
+        out[m] = 27.0 * (n0 + n1 + n2 + n3 + n4)
+
+
+def _numba():
+    import numba
+    raw_2d = numba.njit(cache=True)(_raw_2d_kernel)
+    raw_3d = numba.njit(cache=True)(_raw_3d_kernel)
+    raw_4d = numba.njit(cache=True)(_raw_4d_kernel)
+
+    def compiled(kernel, *tables):
+        # The permutation is read at each call, as noise.seed() replaces it
+        def run(*coords):
+            coords = numpy.broadcast_arrays(
+                *[numpy.asarray(c, dtype=numpy.float64) for c in coords])
+            shape = coords[0].shape
+            out = numpy.empty(coords[0].size)
+            kernel(*[numpy.ascontiguousarray(c).ravel() for c in coords],
+                   noise._perm_array, *tables, out)
+            return out.reshape(shape)
+        return run
+    return Backend('numba', compiled(raw_2d, noise._grad3_array),
+                   compiled(raw_3d, noise._grad3_array),
+                   compiled(raw_4d, noise._grad4_array, noise._simplex_array))
+
+
+"""Backend factories by name, slowest first. Factories raise ImportError
+when their dependencies are missing."""
+_factories = {
+    'reference': _reference,
+    'numpy': _numpy,
+    'numba': _numba,
+    }
+_backends = {}
+_current = None
+
+
+def register(name, factory):
+    """Add a backend, built by calling `factory` when first needed."""
+    _factories[name] = factory
+    _backends.pop(name, None)
+
+
+def get(name):
+    backend = _backends.get(name)
+    if backend is None:
+        backend = _backends[name] = _factories[name]()
+    return backend
+
+
+def available():
+    """Names of the backends whose dependencies are installed."""
+    names = []
+    for name in _factories:
+        try:
+            get(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def timing(backend, points=20000):
+    """Seconds taken by `backend` for 2D noise over `points` points."""
+    rng = numpy.random.default_rng(0)
+    x, y = rng.uniform(-1000.0, 1000.0, (2, points))
+    # Once to compile or warm up, then timed
+    backend.raw_noise_2d(x[:16], y[:16])
+    start = time.perf_counter()
+    backend.raw_noise_2d(x, y)
+    return time.perf_counter() - start
+
+
+def fastest(names=None):
+    """Name of the fastest backend among `names`, or among those installed.
+
+    Backends failing to run, e.g. failing to compile, are left out; the
+    reference backend always works.
+    """
+    if names is None:
+        names = [name for name in available() if name != 'reference']
+    timings = {}
+    for name in names:
+        try:
+            timings[name] = timing(get(name))
+        except Exception:
+            continue
+    if not timings:
+        return 'reference'
+    return min(timings, key=timings.get)
+
+
+def use(name):
+    global _current
+    _current = get(name)
+    return _current
+
+
+def current():
+    """The backend in use: NOISE_BACKEND from the environment if set,
+    otherwise the fastest one."""
+    if _current is None:
+        use(os.environ.get('NOISE_BACKEND') or fastest())
+    return _current
+
+
+def check(name, points=10000, tolerance=1e-12):
+    """Largest differences between backend `name` and the reference.
+
+    Returns a dict of the largest absolute difference per function, and
+    raises AssertionError if any is above `tolerance`.
+    """
+    backend = get(name)
+    reference = get('reference')
+    rng = numpy.random.default_rng(0)
+    x, y, z, w = rng.uniform(-1000.0, 1000.0, (4, points))
+    cases = {
+        'raw_noise_2d': lambda b: b.raw_noise_2d(x, y),
+        'raw_noise_3d': lambda b: b.raw_noise_3d(x, y, z),
+        'octave_noise_2d': lambda b: b.octave_noise_2d(4, 0.5, 0.01, x, y),
+        'raw_noise_4d': lambda b: b.raw_noise_4d(x, y, z, w),
+        'octave_noise_3d': lambda b: b.octave_noise_3d(4, 0.5, 0.01, x, y, z),
+        'octave_noise_4d': lambda b: b.octave_noise_4d(4, 0.5, 0.01, x, y, z, w),
+        'raw_noise_2d_grad': lambda b: numpy.stack(b.raw_noise_2d_grad(x, y)),
+        }
+    errors = {}
+    for function, case in cases.items():
+        errors[function] = float(numpy.abs(case(backend) - case(reference)).max())
+    bad = {f: e for f, e in errors.items() if e > tolerance}
+    if bad:
+        raise AssertionError('backend %s differs from the reference: %r' % (name, bad))
+    return errors
+
+
+if __name__ == '__main__':
+    failed = False
+    for name in available():
+        try:
+            errors = check(name)
+        except AssertionError as e:
+            print(e)
+            failed = True
+            continue
+        print('%-10s %10.6fs  max error %g' % (
+            name, timing(get(name)), max(errors.values())))
+    print('fastest:', fastest())
+    sys.exit(1 if failed else 0)
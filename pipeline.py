@@ -0,0 +1,92 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
+import chunks
+import noise
+from geometry import merge
+from terrain import Heightfield, elevation_grad_array, road_mesh
+
+
+def _seed(noise_seed):
+    # Workers outlive single tasks, so only rebuild the table on change
+    if noise.current_seed() != noise_seed:
+        noise.seed(noise_seed)
+
+
+def _heightfield_band(noise_seed, xs, ys):
+    _seed(noise_seed)
+    return elevation_grad_array(*numpy.meshgrid(xs, ys, indexing='ij'))
+
+
+def _chunk(noise_seed, seed, size, resolution, key):
+    _seed(noise_seed)
+    return chunks.chunk(seed, size, resolution, key)
+
+
+def _roads(noise_seed, a, b, heightfield):
+    _seed(noise_seed)
+    return road_mesh(a, b, heightfield)
+
+
+class Pipeline:
+    """Generation split into spatial work units run on a process pool.
+
+    Workers only ever return plain arrays (and Heightfields made of them);
+    turning them into Geoms is left to the calling process. Every task
+    carries the calling process' noise.current_seed(), so workers evaluate
+    the same noise.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(self.workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+    def units(self, n):
+        # A few units per worker keeps them busy when units are uneven
+        return max(1, min(n, self.workers * 4))
+
+    def heightfield(self, diameter=10000.0, resolution=80.0, origin=(0.0, 0.0)):
+        # Empty heightfield for the grid, filled in by bands of rows
+        grid = Heightfield(diameter, resolution, origin, heights=numpy.empty(0))
+        futures = [
+            self.executor.submit(_heightfield_band, noise.current_seed(), xs, grid.ys)
+            for xs in numpy.array_split(grid.xs, self.units(grid.n))]
+        bands = [future.result() for future in futures]
+        grid.heights, grid.dx, grid.dy = (numpy.concatenate(grids) for grids in zip(*bands))
+        return grid
+
+    def chunks(self, seed, size, resolution, keys):
+        """Heightfields and mesh arrays of the terrain chunks at `keys`.
+
+        Every chunk is submitted at once and they come back in the order of
+        `keys`, each as soon as it is done.
+        """
+        futures = [
+            self.executor.submit(_chunk, noise.current_seed(),
+                                 seed, size, resolution, key)
+            for key in keys]
+        return (future.result() for future in futures)
+
+    def roads(self, points, edges, heightfield):
+        """Road mesh arrays for `edges`, meshed in spatial tiles."""
+        a = points[edges[:, 0]]
+        b = points[edges[:, 1]]
+        # Tiles are vertical stripes, by the x of the middle of each road
+        middle = (a[:, 0] + b[:, 0]) / 2.0
+        order = numpy.argsort(middle, kind='stable')
+        futures = [
+            self.executor.submit(_roads, noise.current_seed(),
+                                 a[unit], b[unit], heightfield)
+            for unit in numpy.array_split(order, self.units(len(order)))]
+        return merge(future.result() for future in futures)
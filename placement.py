@@ -0,0 +1,153 @@
+"""Collision-free placement of square building lots.
+
+Lots are `size` metres squares given by their lowest corner. The spatial
+hash is a grid of `size` metres cells keyed by that corner: two lots whose
+corners fall in the same cell always overlap, so each cell holds at most
+one lot and a candidate only has to be checked against the 3x3 cells
+around its own. Road corridors, ROAD_WIDTH wide, are checked with a
+spatial.SegmentIndex over the roads.
+"""
+
+import numpy
+
+from profiling import count, timed
+from terrain import ROAD_WIDTH
+
+
+def random_in_circle_array(n, rng):
+    """`n` uniformly distributed points in the unit circle, as two arrays."""
+    t = 2 * numpy.pi * rng.random(n)
+    u = rng.random(n) + rng.random(n)
+    r = numpy.where(u > 1, 2 - u, u)
+    return r * numpy.cos(t), r * numpy.sin(t)
+
+
+class Placement:
+    """Lots placed so far within `radius` metres of `center`.
+
+    `roads` is a SegmentIndex over the road network, or None.
+    """
+
+    def __init__(self, radius, size=50.0, roads=None, road_width=ROAD_WIDTH,
+                 center=(0.0, 0.0)):
+        self.radius = float(radius)
+        self.size = float(size)
+        self.roads = roads
+        self.road_width = road_width
+        self.center = center
+        # One cell of margin around the circle, so neighbours never wrap
+        self.n = int(2 * self.radius // self.size) + 3
+        self.origin = (center[0] - self.radius - self.size,
+                       center[1] - self.radius - self.size)
+        self.xs = numpy.full((self.n, self.n), numpy.nan)
+        self.ys = numpy.full((self.n, self.n), numpy.nan)
+        self.order = numpy.full((self.n, self.n), -1, dtype=numpy.int64)
+        self.placed = 0
+        # Scratch grids of the candidates in a batch
+        self.batch_xs = numpy.full((self.n, self.n), numpy.nan)
+        self.batch_ys = numpy.full((self.n, self.n), numpy.nan)
+        self.rank = numpy.full((self.n, self.n), numpy.iinfo(numpy.int64).max)
+
+    def cells(self, xs, ys):
+        i = ((xs - self.origin[0]) // self.size).astype(numpy.int64)
+        j = ((ys - self.origin[1]) // self.size).astype(numpy.int64)
+        return i, j
+
+    def on_road(self, xs, ys):
+        """Whether each lot overlaps a road corridor."""
+        if self.roads is None or not len(xs):
+            return numpy.zeros(len(xs), dtype=bool)
+        w = self.road_width / 2.0
+        boxes = numpy.stack((xs - w, ys - w, xs + self.size + w, ys + self.size + w), axis=1)
+        return self.roads.box_any(boxes)
+
+    def overlapping(self, xs, ys, i, j, grid_xs, grid_ys):
+        """Whether each lot overlaps a lot of the grids in its 3x3 cells."""
+        hit = numpy.zeros(len(xs), dtype=bool)
+        for di in (-1, 0, 1):
+            for dj in (-1, 0, 1):
+                ox = grid_xs[i + di, j + dj]
+                oy = grid_ys[i + di, j + dj]
+                # Empty cells are NaN and never compare as overlapping
+                hit |= (numpy.abs(ox - xs) < self.size) & (numpy.abs(oy - ys) < self.size)
+        return hit
+
+    @timed('building placement')
+    def add(self, xs, ys, limit=None):
+        """Place the lots at `xs`, `ys` that fit, earlier ones first.
+
+        Returns the indices of the lots placed, at most `limit` of them. A
+        lot is rejected if it overlaps a road, a lot placed before, or an
+        earlier lot of the same batch that was itself a candidate for
+        placement.
+        """
+        xs = numpy.asarray(xs, dtype=numpy.float64)
+        ys = numpy.asarray(ys, dtype=numpy.float64)
+        # Lots placed before first, they reject more candidates for less
+        i, j = self.cells(xs, ys)
+        candidates = numpy.flatnonzero(~self.overlapping(xs, ys, i, j, self.xs, self.ys))
+        keep = ~self.on_road(xs[candidates], ys[candidates])
+        candidates = candidates[keep]
+        i, j = i[candidates], j[candidates]
+        # First candidate of each cell
+        _, first = numpy.unique(i * self.n + j, return_index=True)
+        first.sort()
+        candidates, i, j = candidates[first], i[first], j[first]
+        # Against the earlier candidates of the batch in the neighbouring cells
+        self.batch_xs[i, j] = xs[candidates]
+        self.batch_ys[i, j] = ys[candidates]
+        self.rank[i, j] = candidates
+        hit = numpy.zeros(len(candidates), dtype=bool)
+        for di in (-1, 0, 1):
+            for dj in (-1, 0, 1):
+                if di or dj:
+                    earlier = self.rank[i + di, j + dj] < candidates
+                    hit |= earlier & (
+                        (numpy.abs(self.batch_xs[i + di, j + dj] - xs[candidates]) < self.size) &
+                        (numpy.abs(self.batch_ys[i + di, j + dj] - ys[candidates]) < self.size))
+        self.batch_xs[i, j] = numpy.nan
+        self.batch_ys[i, j] = numpy.nan
+        self.rank[i, j] = numpy.iinfo(numpy.int64).max
+        candidates, i, j = candidates[~hit], i[~hit], j[~hit]
+        # Lots left over once `limit` is reached are neither placed nor rejected
+        count('lots rejected', len(xs) - len(candidates))
+        candidates, i, j = candidates[:limit], i[:limit], j[:limit]
+        self.xs[i, j] = xs[candidates]
+        self.ys[i, j] = ys[candidates]
+        self.order[i, j] = numpy.arange(self.placed, self.placed + len(candidates))
+        self.placed += len(candidates)
+        count('lots placed', len(candidates))
+        return candidates
+
+    def place(self, n, rng, batch=4096, attempts=20):
+        """Place up to `n` lots at random, in batches of candidates.
+
+        Gives up after `attempts` candidates per lot wanted, when the area is
+        too crowded. Returns the corners of the new lots as an (m, 2) array,
+        in placement order.
+        """
+        xs = []
+        ys = []
+        wanted = n
+        tried = 0
+        while wanted > 0 and tried < attempts * n:
+            size = min(batch, max(wanted, 64))
+            cx, cy = random_in_circle_array(size, rng)
+            cx = cx * self.radius + self.center[0]
+            cy = cy * self.radius + self.center[1]
+            placed = self.add(cx, cy, wanted)
+            xs.append(cx[placed])
+            ys.append(cy[placed])
+            wanted -= len(placed)
+            tried += size
+        if not xs:
+            return numpy.zeros((0, 2))
+        return numpy.stack((numpy.concatenate(xs), numpy.concatenate(ys)), axis=1)
+
+    def lots(self):
+        """Corners of every lot placed, as an (n, 2) array in placement order."""
+        placed = self.order >= 0
+        result = numpy.empty((self.placed, 2))
+        result[self.order[placed], 0] = self.xs[placed]
+        result[self.order[placed], 1] = self.ys[placed]
+        return result
@@ -0,0 +1,79 @@
+"""Timing spans and counters for the generation stages.
+
+Stages wrap their work in `span(name)` and report what they produced with
+`count(name, n)`. Spans are inclusive, so a span that runs inside another
+one (e.g. noise sampling while meshing roads) is also part of the outer
+span's time. Only the current process is measured: work done on Pipeline
+workers shows up as time spent waiting in the calling process.
+"""
+
+import functools
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+_lock = threading.Lock()
+_spans = defaultdict(lambda: [0, 0.0])
+_counters = defaultdict(int)
+
+
+@contextmanager
+def span(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            record = _spans[name]
+            record[0] += 1
+            record[1] += elapsed
+
+
+def timed(name):
+    """Decorator running every call of a function in span(name)."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, n=1):
+    with _lock:
+        _counters[name] += n
+
+
+def reset():
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+
+
+def report():
+    with _lock:
+        return {
+            'spans': {
+                name: {'calls': calls, 'seconds': seconds}
+                for name, (calls, seconds) in _spans.items()},
+            'counters': dict(_counters),
+            }
+
+
+def dumps():
+    return json.dumps(report(), indent=4, sort_keys=True)
+
+
+def text():
+    """Short human readable version of the report."""
+    data = report()
+    lines = ['%-24s %5d %9.3fs' % (name, s['calls'], s['seconds'])
+             for name, s in sorted(data['spans'].items())]
+    lines += ['%-24s %15d' % (name, n)
+              for name, n in sorted(data['counters'].items())]
+    return '\n'.join(lines)
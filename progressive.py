@@ -0,0 +1,57 @@
+import queue
+import threading
+import time
+
+from direct.task import Task
+
+from profiling import span
+
+
+class Progressive:
+    """Runs generation on a thread and applies its results from the main loop.
+
+    `work` is an iterable, consumed on a background thread, of callables that
+    touch the scene graph (typically attaching a freshly generated node).
+    They are queued and `task`, added to the task manager, runs as many of
+    them per frame as fit in `budget` seconds.
+    """
+
+    def __init__(self, work, budget=0.004):
+        self.work = work
+        self.budget = budget
+        self.queue = queue.Queue()
+        self.finished = False
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        try:
+            for action in self.work:
+                self.queue.put(action)
+        except Exception as e:
+            self.error = e
+        self.queue.put(None)
+
+    def step(self):
+        """Apply queued actions until the budget is spent. True once done."""
+        deadline = time.perf_counter() + self.budget
+        while not self.finished and time.perf_counter() < deadline:
+            try:
+                action = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if action is None:
+                self.finished = True
+                if self.error is not None:
+                    raise self.error
+            else:
+                with span('scene attachment'):
+                    action()
+        return self.finished
+
+    def task(self, task):
+        return Task.done if self.step() else Task.cont
@@ -0,0 +1,238 @@
+from math import floor, hypot
+
+import numpy
+
+from geometry import grid_triangles, mesh_node
+from profiling import count, timed
+from seeds import generator
+from terrain import (
+    QUANTUM,
+    Heightfield,
+    elevation,
+    elevation_color_array,
+    shaded_colors,
+    )
+
+
+# Neighbour directions and the bit of each in a patch's stitching mask
+WEST, EAST, SOUTH, NORTH = 1, 2, 4, 8
+_directions = ((-1, 0, WEST), (1, 0, EAST), (0, -1, SOUTH), (0, 1, NORTH))
+
+
+class QuadtreeTerrain:
+    """Terrain patches refined around the camera by screen space error.
+
+    The `size` metres square around the origin is the root of a quadtree
+    `levels` deep. Every node is a patch of `patch` by `patch` quads, so each
+    level halves the spacing of the one above. A node is split while its
+    error, the largest vertical difference between the patch and the exact
+    elevation at the centre of its quads (its heightfield's estimate rather
+    than the looser bound, so as to follow the relief), projects to more
+    than `tolerance` pixels from the camera; `projection` is the screen
+    height in pixels over 2 tan(fov / 2). The projected error falls with distance, so the number of
+    patches depends on the relief rather than on how far the view reaches.
+
+    Neighbouring leaves differ by at most one level. Where a patch borders a
+    coarser one, its edge vertices between two of the coarser patch's are
+    snapped onto the coarser edge so there are no cracks. Leaves are keyed
+    by (level, i, j, mask), the mask marking the edges snapped, and only
+    leaves whose key changes are rebuilt when the camera moves.
+
+    Has the interface of TerrainChunks: `wanted`, `build`, `build_many` and
+    `attach` to generate leaves elsewhere, `update` to follow the camera and `sample`.
+    """
+
+    def __init__(self, parent, size=10240.0, patch=16, levels=7, tolerance=2.0,
+                 projection=800.0, seed=0):
+        if int(size) % (patch * 2 ** levels):
+            raise ValueError('size must be a multiple of patch * 2 ** levels')
+        self.parent = parent
+        self.size = int(size)
+        self.patch = patch
+        self.levels = levels
+        self.tolerance = tolerance
+        self.projection = projection
+        self.seed = seed
+        self.origin = (-self.size / 2.0, -self.size / 2.0)
+        # Heightfields of the nodes looked at, and of the attached leaves
+        self.fields = {}
+        self.nodes = {}
+        self.pending = {}
+        # Keys of the refinement being built, see update
+        self.target = None
+
+    def node_size(self, level):
+        return self.size // 2 ** level
+
+    def heightfield(self, node):
+        field = self.fields.get(node)
+        if field is None:
+            level, i, j = node
+            size = self.node_size(level)
+            center = (self.origin[0] + (i + 0.5) * size,
+                      self.origin[1] + (j + 0.5) * size)
+            field = Heightfield(size, size // self.patch, center, estimate=True)
+            self.fields[node] = field
+        return field
+
+    def distance(self, node, x, y, z):
+        # Distance from (x, y, z) to the box around the node's heights
+        level, i, j = node
+        size = self.node_size(level)
+        x0 = self.origin[0] + i * size
+        y0 = self.origin[1] + j * size
+        dx = max(x0 - x, 0, x - (x0 + size))
+        dy = max(y0 - y, 0, y - (y0 + size))
+        heights = self.heightfield(node).heights
+        dz = max(float(heights.min()) - z, 0, z - float(heights.max()))
+        return hypot(hypot(dx, dy), dz)
+
+    def refine(self, node, x, y, z):
+        if node[0] >= self.levels:
+            return False
+        error = self.heightfield(node).estimate
+        distance = max(self.distance(node, x, y, z), 1e-6)
+        return error * self.projection / distance > self.tolerance
+
+    def covering(self, leaves, level, i, j):
+        """Leaf containing the node (level, i, j), or None if it is split."""
+        for k in range(level + 1):
+            node = (level - k, i >> k, j >> k)
+            if node in leaves:
+                return node
+        return None
+
+    @timed('quadtree selection')
+    def leaves(self, x, y, z):
+        """Leaves to draw from (x, y, z) mapped to their stitching masks."""
+        used = set()
+        leaves = set()
+        stack = [(0, 0, 0)]
+        while stack:
+            node = stack.pop()
+            used.add(node)
+            if self.refine(node, x, y, z):
+                level, i, j = node
+                stack.extend((level + 1, 2 * i + a, 2 * j + b)
+                             for a in (0, 1) for b in (0, 1))
+            else:
+                leaves.add(node)
+        # Split leaves until neighbours differ by at most one level
+        changed = True
+        while changed:
+            changed = False
+            for level, i, j in list(leaves):
+                for di, dj, bit in _directions:
+                    ni, nj = i + di, j + dj
+                    if not (0 <= ni < 2 ** level and 0 <= nj < 2 ** level):
+                        continue
+                    neighbour = self.covering(leaves, level, ni, nj)
+                    if neighbour is not None and neighbour[0] < level - 1:
+                        leaves.remove(neighbour)
+                        l, a, b = neighbour
+                        leaves.update((l + 1, 2 * a + c, 2 * b + d)
+                                      for c in (0, 1) for d in (0, 1))
+                        changed = True
+        # Stitch the edges along coarser neighbours
+        result = {}
+        for level, i, j in leaves:
+            mask = 0
+            for di, dj, bit in _directions:
+                ni, nj = i + di, j + dj
+                if 0 <= ni < 2 ** level and 0 <= nj < 2 ** level:
+                    neighbour = self.covering(leaves, level, ni, nj)
+                    if neighbour is not None and neighbour[0] < level:
+                        mask |= bit
+            result[(level, i, j)] = mask
+        # Forget the heightfields of nodes no longer needed
+        used.update(leaves)
+        used.update(key[:3] for key in self.nodes)
+        self.fields = {node: field for node, field in self.fields.items()
+                       if node in used}
+        return result
+
+    def wanted(self, x, y, z=None):
+        if z is None:
+            z = elevation(x, y)
+        leaves = self.leaves(x, y, z)
+        keys = [node + (mask,) for node, mask in leaves.items()]
+        keys.sort(key=lambda k: self.distance(k[:3], x, y, z))
+        return keys
+
+    def build(self, key):
+        """Heightfield and mesh arrays of the leaf `key`."""
+        level, i, j, mask = key
+        heightfield = self.heightfield((level, i, j))
+        xs, ys = heightfield.grid()
+        heights = heightfield.heights.copy()
+        # Edge vertices between two of a coarser neighbour's lie on its edge
+        if mask & WEST:
+            heights[0, 1::2] = (heights[0, 0:-2:2] + heights[0, 2::2]) / 2
+        if mask & EAST:
+            heights[-1, 1::2] = (heights[-1, 0:-2:2] + heights[-1, 2::2]) / 2
+        if mask & SOUTH:
+            heights[1::2, 0] = (heights[0:-2:2, 0] + heights[2::2, 0]) / 2
+        if mask & NORTH:
+            heights[1::2, -1] = (heights[0:-2:2, -1] + heights[2::2, -1]) / 2
+        vertices = numpy.stack((xs, ys, heights), axis=-1).reshape(-1, 3)
+        rng = generator(self.seed, 'quadtree', level, i, j)
+        colors = shaded_colors(elevation_color_array(heights, rng),
+                               heightfield.dx, heightfield.dy).reshape(-1, 4)
+        count('patches')
+        return heightfield, (vertices, colors, grid_triangles(heightfield.n))
+
+    def build_many(self, keys, pipeline=None):
+        """(key, heightfield, mesh) of the leaves at `keys`, in order.
+
+        Leaves are built here even with a Pipeline: `wanted` has already
+        sampled their heightfields, leaving little more than the meshing.
+        """
+        for key in keys:
+            yield (key,) + self.build(key)
+
+    def attach(self, key, heightfield, mesh):
+        if key in self.nodes:
+            return
+        node = mesh_node('TerrainPatch%d_%d_%d_%d' % key, *mesh, step=QUANTUM)
+        self.fields[key[:3]] = heightfield
+        self.nodes[key] = self.parent.attachNewNode(node)
+
+    def update(self, position, limit=None):
+        """Refine the leaves for `position` and rebuild the ones that changed.
+
+        At most `limit` leaves are built per call. The new leaves replace the
+        old ones only once they are all built, so the terrain never has holes.
+        A refinement under way is finished before the next one is selected,
+        so the replacement happens even while the camera keeps moving.
+        Returns the number of leaves built.
+        """
+        if self.target is None:
+            x, y, z = position[0], position[1], position[2]
+            self.target = self.wanted(x, y, z)
+        built = 0
+        for key in self.target:
+            if key in self.nodes or key in self.pending:
+                continue
+            if limit is not None and built >= limit:
+                return built
+            self.pending[key] = self.build(key)
+            built += 1
+        for key, (heightfield, mesh) in self.pending.items():
+            self.attach(key, heightfield, mesh)
+        self.pending = {}
+        wanted = set(self.target)
+        for key in [k for k in self.nodes if k not in wanted]:
+            self.nodes.pop(key).removeNode()
+        self.target = None
+        return built
+
+    def sample(self, x, y):
+        """Elevation at (x, y) from the finest heightfield there, or exact."""
+        for level in range(self.levels, -1, -1):
+            size = self.node_size(level)
+            node = (level, floor((x - self.origin[0]) / size),
+                    floor((y - self.origin[1]) / size))
+            field = self.fields.get(node)
+            if field is not None:
+                return field.sample(x, y)
+        return elevation(x, y)
@@ -0,0 +1,54 @@
+import numpy
+
+from spatial import RoadIndex
+
+
+class RoadGraph:
+    """Undirected road graph of a triangulation in flat arrays.
+
+    `edges` holds every road once as an (E, 2) array of point indices, lowest
+    index first. Neighbours are stored in compressed sparse row form: the
+    neighbours of point i are `neighbours[offsets[i]:offsets[i + 1]]`, in
+    increasing order. `lengths` and `grades` (height difference over length)
+    are precomputed per edge.
+    """
+
+    def __init__(self, points, triangles):
+        points = numpy.asarray(points, dtype=numpy.float64)
+        triangles = numpy.asarray(triangles, dtype=numpy.int64).reshape(-1, 3)
+        n = len(points)
+        self.points = points
+        # Unique undirected edges
+        pairs = numpy.concatenate((
+            triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [2, 0]]))
+        pairs.sort(axis=1)
+        keys = numpy.unique(pairs[:, 0] * n + pairs[:, 1])
+        self.edges = numpy.stack((keys // n, keys % n), axis=1).astype(numpy.int32)
+        # Adjacency, both directions of every edge
+        source = numpy.concatenate((self.edges[:, 0], self.edges[:, 1]))
+        target = numpy.concatenate((self.edges[:, 1], self.edges[:, 0]))
+        order = numpy.lexsort((target, source))
+        self.neighbours = target[order]
+        self.offsets = numpy.zeros(n + 1, dtype=numpy.int32)
+        numpy.cumsum(numpy.bincount(source, minlength=n), out=self.offsets[1:])
+        # Per edge measures
+        ab = points[self.edges[:, 1]] - points[self.edges[:, 0]]
+        self.lengths = numpy.sqrt((ab * ab).sum(axis=1))
+        self.grades = numpy.abs(ab[:, 2]) / self.lengths
+
+    def __len__(self):
+        return len(self.edges)
+
+    def degree(self, i):
+        return int(self.offsets[i + 1] - self.offsets[i])
+
+    def adjacent(self, i):
+        return self.neighbours[self.offsets[i]:self.offsets[i + 1]]
+
+    def endpoints(self):
+        """Start and end points of every edge, as two (E, 3) arrays."""
+        return self.points[self.edges[:, 0]], self.points[self.edges[:, 1]]
+
+    def index(self, cell=None):
+        """Grid index over the nodes and edges, see spatial.RoadIndex."""
+        return RoadIndex(self, cell)
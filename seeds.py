@@ -0,0 +1,23 @@
+import hashlib
+import random
+
+import numpy
+
+
+def derive(seed, *key):
+    """64-bit seed of the stream named `key` within the world `seed`.
+
+    Streams are derived by hashing rather than drawn one after another, so
+    every stage and chunk gets the same numbers whatever the order, or the
+    process, in which they are generated.
+    """
+    text = repr((seed,) + key)
+    return int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+
+
+def stream(seed, *key):
+    return random.Random(derive(seed, *key))
+
+
+def generator(seed, *key):
+    return numpy.random.default_rng(derive(seed, *key))
@@ -0,0 +1,223 @@
+"""Uniform grid indexes over points and segments in the plane.
+
+Every item is registered in each grid cell its bounding box overlaps, and
+the cells are stored in compressed sparse row form. Queries come in a
+single version, and a "_many" version answering a whole batch of queries
+with a few array operations. Batches are much faster per query.
+"""
+
+import numpy
+
+
+def _rectangles(i0, i1, j0, j1):
+    """Every (owner, i, j) for owners covering cells [i0, i1] x [j0, j1]."""
+    w = i1 - i0 + 1
+    counts = w * (j1 - j0 + 1)
+    owner = numpy.repeat(numpy.arange(len(counts)), counts)
+    local = numpy.arange(len(owner)) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    return owner, i0[owner] + local % w[owner], j0[owner] + local // w[owner]
+
+
+def _ring(r):
+    """Cell offsets at Chebyshev distance r."""
+    if r == 0:
+        return numpy.zeros(1, dtype=numpy.int64), numpy.zeros(1, dtype=numpy.int64)
+    side = numpy.arange(-r, r + 1)
+    inner = side[1:-1]
+    di = numpy.concatenate((side, side, numpy.full(len(inner), -r), numpy.full(len(inner), r)))
+    dj = numpy.concatenate((numpy.full(len(side), -r), numpy.full(len(side), r), inner, inner))
+    return di, dj
+
+
+class GridIndex:
+    """Uniform grid over items with axis aligned bounding boxes.
+
+    Subclasses provide the items and their exact `distance` to query points
+    and `overlaps` test against query boxes.
+    """
+
+    def __init__(self, lo, hi, cell):
+        self.size = len(lo)
+        self.cell = float(cell)
+        if self.size:
+            self.origin = lo.min(axis=0)
+            extent = hi.max(axis=0) - self.origin
+        else:
+            self.origin = numpy.zeros(2)
+            extent = numpy.zeros(2)
+        self.shape = tuple((extent // self.cell).astype(numpy.int64) + 1)
+        i0, j0 = self.cells(lo[:, 0], lo[:, 1])
+        i1, j1 = self.cells(hi[:, 0], hi[:, 1])
+        item, i, j = _rectangles(i0, i1, j0, j1)
+        cell = i * self.shape[1] + j
+        order = numpy.argsort(cell, kind='stable')
+        self.items = item[order]
+        self.offsets = numpy.zeros(self.shape[0] * self.shape[1] + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(cell, minlength=len(self.offsets) - 1),
+                     out=self.offsets[1:])
+
+    def cells(self, xs, ys):
+        """Grid cell of each point, clamped to the grid."""
+        i = numpy.floor((xs - self.origin[0]) / self.cell).astype(numpy.int64)
+        j = numpy.floor((ys - self.origin[1]) / self.cell).astype(numpy.int64)
+        return (numpy.clip(i, 0, self.shape[0] - 1),
+                numpy.clip(j, 0, self.shape[1] - 1))
+
+    def gather(self, queries, i, j):
+        """(query, item) pairs for every item in cell (i, j) of each query."""
+        cell = i * self.shape[1] + j
+        start = self.offsets[cell]
+        counts = self.offsets[cell + 1] - start
+        q = numpy.repeat(queries, counts)
+        first = numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        position = numpy.arange(len(q)) - first + numpy.repeat(start, counts)
+        return q, self.items[position]
+
+    def unique(self, q, items):
+        key = numpy.unique(q * self.size + items)
+        return key // self.size, key % self.size
+
+    def nearest_many(self, xs, ys):
+        """Nearest item to each point, and its distance.
+
+        Rings of cells are searched outwards from each point's cell until
+        no cell left can hold anything closer than the best item so far.
+        """
+        xs = numpy.asarray(xs, dtype=numpy.float64).ravel()
+        ys = numpy.asarray(ys, dtype=numpy.float64).ravel()
+        best = numpy.full(len(xs), numpy.inf)
+        ids = numpy.full(len(xs), -1, dtype=numpy.int64)
+        if not self.size:
+            return ids, best
+        ci, cj = self.cells(xs, ys)
+        limit = numpy.maximum.reduce([
+            ci, self.shape[0] - 1 - ci, cj, self.shape[1] - 1 - cj])
+        pending = numpy.arange(len(xs))
+        r = 0
+        while len(pending):
+            di, dj = _ring(r)
+            p = numpy.repeat(pending, len(di))
+            i = ci[p] + numpy.tile(di, len(pending))
+            j = cj[p] + numpy.tile(dj, len(pending))
+            inside = (i >= 0) & (i < self.shape[0]) & (j >= 0) & (j < self.shape[1])
+            q, items = self.gather(p[inside], i[inside], j[inside])
+            if len(q):
+                d = self.distance(xs[q], ys[q], items)
+                numpy.minimum.at(best, q, d)
+                hit = d == best[q]
+                ids[q[hit]] = items[hit]
+            done = (best[pending] <= r * self.cell) | (limit[pending] <= r)
+            pending = pending[~done]
+            r += 1
+        return ids, best
+
+    def nearest(self, x, y):
+        ids, distances = self.nearest_many([x], [y])
+        return int(ids[0]), float(distances[0])
+
+    def within_many(self, xs, ys, radius):
+        """(query, item) pairs of items within `radius` of each point."""
+        xs = numpy.asarray(xs, dtype=numpy.float64).ravel()
+        ys = numpy.asarray(ys, dtype=numpy.float64).ravel()
+        i0, j0 = self.cells(xs - radius, ys - radius)
+        i1, j1 = self.cells(xs + radius, ys + radius)
+        owner, i, j = _rectangles(i0, i1, j0, j1)
+        q, items = self.unique(*self.gather(owner, i, j))
+        keep = self.distance(xs[q], ys[q], items) <= radius
+        return q[keep], items[keep]
+
+    def within(self, x, y, radius):
+        return self.within_many([x], [y], radius)[1]
+
+    def box_many(self, boxes):
+        """(query, item) pairs of items overlapping each (x0, y0, x1, y1) box."""
+        boxes = numpy.asarray(boxes, dtype=numpy.float64).reshape(-1, 4)
+        i0, j0 = self.cells(boxes[:, 0], boxes[:, 1])
+        i1, j1 = self.cells(boxes[:, 2], boxes[:, 3])
+        owner, i, j = _rectangles(i0, i1, j0, j1)
+        q, items = self.unique(*self.gather(owner, i, j))
+        keep = self.overlaps(boxes[q], items)
+        return q[keep], items[keep]
+
+    def box_any(self, boxes):
+        """Whether each (x0, y0, x1, y1) box overlaps any item."""
+        boxes = numpy.asarray(boxes, dtype=numpy.float64).reshape(-1, 4)
+        i0, j0 = self.cells(boxes[:, 0], boxes[:, 1])
+        i1, j1 = self.cells(boxes[:, 2], boxes[:, 3])
+        owner, i, j = _rectangles(i0, i1, j0, j1)
+        q, items = self.gather(owner, i, j)
+        hit = numpy.zeros(len(boxes), dtype=bool)
+        hit[q[self.overlaps(boxes[q], items)]] = True
+        return hit
+
+    def box(self, x0, y0, x1, y1):
+        return self.box_many([(x0, y0, x1, y1)])[1]
+
+
+class PointIndex(GridIndex):
+
+    def __init__(self, points, cell=None):
+        self.points = numpy.asarray(points, dtype=numpy.float64)[:, :2]
+        if cell is None:
+            # About one point per cell
+            extent = numpy.ptp(self.points, axis=0) if len(self.points) else 1.0
+            cell = numpy.sqrt(numpy.prod(numpy.maximum(extent, 1.0)) / max(len(self.points), 1))
+        GridIndex.__init__(self, self.points, self.points, cell)
+
+    def distance(self, xs, ys, items):
+        p = self.points[items]
+        return numpy.hypot(p[:, 0] - xs, p[:, 1] - ys)
+
+    def overlaps(self, boxes, items):
+        p = self.points[items]
+        return ((p[:, 0] >= boxes[:, 0]) & (p[:, 0] <= boxes[:, 2]) &
+                (p[:, 1] >= boxes[:, 1]) & (p[:, 1] <= boxes[:, 3]))
+
+
+class SegmentIndex(GridIndex):
+
+    def __init__(self, a, b, cell=None):
+        self.a = numpy.asarray(a, dtype=numpy.float64)[:, :2]
+        self.b = numpy.asarray(b, dtype=numpy.float64)[:, :2]
+        if cell is None:
+            # About as large as a typical segment
+            lengths = numpy.hypot(*(self.b - self.a).T)
+            cell = max(float(numpy.median(lengths)) if len(lengths) else 1.0, 1.0)
+        GridIndex.__init__(self, numpy.minimum(self.a, self.b),
+                           numpy.maximum(self.a, self.b), cell)
+
+    def distance(self, xs, ys, items):
+        a = self.a[items]
+        ab = self.b[items] - a
+        px = xs - a[:, 0]
+        py = ys - a[:, 1]
+        length2 = (ab * ab).sum(axis=1)
+        t = numpy.clip((px * ab[:, 0] + py * ab[:, 1]) / numpy.maximum(length2, 1e-300), 0, 1)
+        return numpy.hypot(px - t * ab[:, 0], py - t * ab[:, 1])
+
+    def overlaps(self, boxes, items):
+        a = self.a[items]
+        b = self.b[items]
+        # Bounding boxes overlap...
+        overlap = ((numpy.minimum(a[:, 0], b[:, 0]) <= boxes[:, 2]) &
+                   (numpy.maximum(a[:, 0], b[:, 0]) >= boxes[:, 0]) &
+                   (numpy.minimum(a[:, 1], b[:, 1]) <= boxes[:, 3]) &
+                   (numpy.maximum(a[:, 1], b[:, 1]) >= boxes[:, 1]))
+        # ...and the box corners are not all on the same side of the line
+        ab = b - a
+        sides = [
+            numpy.sign(ab[:, 0] * (boxes[:, 1 + 2 * (k // 2)] - a[:, 1]) -
+                       ab[:, 1] * (boxes[:, 2 * (k % 2)] - a[:, 0]))
+            for k in range(4)]
+        low = numpy.minimum.reduce(sides)
+        high = numpy.maximum.reduce(sides)
+        return overlap & (low <= 0) & (high >= 0)
+
+
+class RoadIndex:
+    """Point index over the nodes and segment index over the edges of a RoadGraph."""
+
+    def __init__(self, graph, cell=None):
+        self.graph = graph
+        self.nodes = PointIndex(graph.points, cell)
+        self.edges = SegmentIndex(*graph.endpoints(), cell=cell)
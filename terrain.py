@@ -1,80 +1,329 @@
 from random import random
-from math import cos, sin, pi
+from math import cos, sin, pi, floor, sqrt
 from collections import defaultdict
 
+import numpy
 from panda3d.core import (
     Geom,
     GeomNode,
     GeomLinestrips,
-    GeomTristrips,
     GeomVertexFormat,
     GeomVertexData,
     GeomVertexWriter,
-    Vec3,
     )
 from pyhull.delaunay import DelaunayTri
 
-from noise import scaled_octave_noise_2d
+import noise_backends
+from delaunay import Delaunay
+from geometry import grid_triangles, triangles, write_vertices
+from profiling import count, span, timed
+from roads import RoadGraph
 
 
 MAX_ELEVATION = 250
+NOISE_OCTAVES = 1
+NOISE_PERSISTENCE = 0.5
+NOISE_SCALE = 0.0002
 ROAD_WIDTH = 10
+# Direction towards the sun lighting the terrain colours, see shaded_colors
+SUN = (-0.4, -0.3, 0.87)
+# Step of quantized terrain positions along each axis, shared by every chunk
+# and patch so that their common edges match (see geometry.quantize). Vertex
+# spacings are multiples of it, and meshes up to 16 km across and 512 m
+# high fit in 16 bits.
+QUANTUM = (0.25, 0.25, 1.0 / 128)
 
 
-def random_in_circle():
-    t = 2 * pi * random()
-    u = random () + random()
+def random_in_circle(rng=None):
+    rand = random if rng is None else rng.random
+    t = 2 * pi * rand()
+    u = rand() + rand()
     r = 2 - u if u > 1 else u
     return r * cos(t), r * sin(t)
 
 
 def noise_2d(x, y):
-    return scaled_octave_noise_2d(1, 0.5, 0.0002, -0.25, 1.0, x, y)
+    # Through the backend as well, so single points match noise_2d_array
+    return float(noise_backends.current().scaled_octave_noise_2d(
+        NOISE_OCTAVES, NOISE_PERSISTENCE, NOISE_SCALE, -0.25, 1.0, x, y))
+
+
+def noise_2d_array(x, y):
+    return noise_backends.current().scaled_octave_noise_2d(
+        NOISE_OCTAVES, NOISE_PERSISTENCE, NOISE_SCALE, -0.25, 1.0, x, y)
 
 
 def elevation(x, y):
-    x += 10000.0
-    y += 10000.0
+    count('noise evaluations')
     return noise_2d(x, y) * MAX_ELEVATION
 
 
-def elevation_color(h):
-    c = h / MAX_ELEVATION * 0.8 + 0.1 + (random() * 0.1 - 0.05)
+@timed('noise sampling')
+def elevation_array(x, y):
+    h = noise_2d_array(x, y) * MAX_ELEVATION
+    count('noise evaluations', h.size)
+    return h
+
+
+@timed('noise sampling')
+def elevation_grad_array(x, y):
+    """Elevation and its slope along x and y, from a single noise pass."""
+    h, dx, dy = noise_backends.current().scaled_octave_noise_2d_grad(
+        NOISE_OCTAVES, NOISE_PERSISTENCE, NOISE_SCALE, -0.25, 1.0, x, y)
+    count('noise evaluations', h.size)
+    return h * MAX_ELEVATION, dx * MAX_ELEVATION, dy * MAX_ELEVATION
+
+
+def surface_normals(dx, dy):
+    """Unit normals, as (..., 3) arrays, of a surface with slopes dx and dy."""
+    n = numpy.stack((-dx, -dy, numpy.ones_like(dx)), axis=-1)
+    return n / numpy.sqrt((n * n).sum(axis=-1))[..., None]
+
+
+def shaded_colors(colors, dx, dy):
+    """`colors` lit by the SUN on a surface with slopes dx and dy.
+
+    Flat ground keeps its colour, slopes facing the sun get lighter and
+    those facing away darker.
+    """
+    sun = numpy.array(SUN) / numpy.sqrt(numpy.dot(SUN, SUN))
+    light = numpy.maximum(surface_normals(dx, dy) @ sun / sun[2], 0.0)
+    shaded = numpy.array(colors, dtype=numpy.float64)
+    shaded[..., :3] = numpy.clip(shaded[..., :3] * light[..., None], 0.0, 1.0)
+    return shaded
+
+
+def noise_curvature_bound():
+    """Upper bound of the second derivative of raw_noise_2d along x or y.
+
+    At most three corners add to the noise at any point, each adding
+    70 t^4 (g.d) where d is the offset from the corner, t = 0.5 - |d|^2 > 0
+    and g its gradient. The second derivative of that along x is
+    48 dx^2 t^2 (g.d) - 8 t^3 (g.d) - 16 dx t^3 gx, and with |g| <= sqrt(2)
+    and |gx| <= 1 it is at most b(r) = 48 sqrt(2) r^3 t^2 + (8 sqrt(2) + 16)
+    r t^3 where r = |d|. The largest b over 0 <= r <= sqrt(0.5) is at one
+    of the ends or where b' is zero.
+    """
+    Polynomial = numpy.polynomial.Polynomial
+    r = Polynomial([0.0, 1.0])
+    t = 0.5 - r * r
+    b = 48 * sqrt(2) * r ** 3 * t ** 2 + (8 * sqrt(2) + 16) * r * t ** 3
+    ends = [0.0, sqrt(0.5)]
+    critical = [x.real for x in b.deriv().roots()
+                if abs(x.imag) < 1e-9 and 0 <= x.real <= sqrt(0.5)]
+    return 3 * 70 * max(b(x) for x in ends + critical)
+
+
+def elevation_curvature_bound():
+    """Upper bound of the second derivative of elevation along x or y."""
+    amplitudes = NOISE_PERSISTENCE ** numpy.arange(NOISE_OCTAVES)
+    frequencies = NOISE_SCALE * 2.0 ** numpy.arange(NOISE_OCTAVES)
+    octaves = (amplitudes * frequencies ** 2).sum() / amplitudes.sum()
+    # elevation is noise_2d, scaled from (-1, 1) to (-0.25, 1.0), times MAX_ELEVATION
+    return MAX_ELEVATION * (1.0 + 0.25) / 2 * octaves * noise_curvature_bound()
+
+
+def elevation_color(h, rng=None):
+    rand = random if rng is None else rng.random
+    c = h / MAX_ELEVATION * 0.8 + 0.1 + (rand() * 0.1 - 0.05)
     return (c, c, c, 0) if h > 0 else (1, 1, 1, 0)
 
 
-class Terrain:
+def elevation_color_array(h, rng=None):
+    rand = numpy.random.random if rng is None else rng.random
+    c = h / MAX_ELEVATION * 0.8 + 0.1 + (rand(h.shape) * 0.1 - 0.05)
+    c = numpy.where(h > 0, c, 1.0)
+    a = numpy.zeros_like(c)
+    return numpy.stack((c, c, c, a), axis=-1)
 
-    def __init__(self, diameter=10000.0, resolution=80.0):
-        self.fmt = GeomVertexFormat.getV3c4()
+
+@timed('road meshing')
+def road_mesh(a, b, heightfield):
+    """Vertices, colours and triangles of the roads from `a` to `b`.
+
+    `a` and `b` are (n, 3) arrays with the end points of every road. Each
+    road is a strip of quads, ROAD_WIDTH wide and about 25 metres long,
+    lying just above the highest of the two sides of the road. Steep roads,
+    whose steepest grade along the way is over 10%, are red, long roads
+    blue and the rest grey.
+    """
+    w = ROAD_WIDTH / 2.0
+    ab = b - a
+    n = numpy.sqrt((ab * ab).sum(axis=1))
+    probes = numpy.maximum(2, n / 25)
+    probe_counts = probes.astype(numpy.int64) + 1
+    # Horizontal offset to the sides of the road, as Vec3.up().cross(ab)
+    pab = numpy.zeros_like(ab)
+    pab[:, 0] = -ab[:, 1] / n * w
+    pab[:, 1] = ab[:, 0] / n * w
+    # One probe per cross section, for every road at once
+    road = numpy.repeat(numpy.arange(len(a)), probe_counts)
+    first = numpy.cumsum(probe_counts) - probe_counts
+    i = numpy.arange(len(road)) - first[road]
+    p = a[road] + ab[road] / probes[road, None] * i[:, None]
+    # Grade at every probe, the slope of the ground along the road
+    dx, dy = heightfield.sample_grad_many(p[:, 0], p[:, 1])
+    grade = numpy.abs(dx * ab[road, 0] + dy * ab[road, 1]) / n[road]
+    steepest = numpy.maximum.reduceat(grade, first) if len(grade) else grade
+    p1 = p + pab[road]
+    p2 = p - pab[road]
+    z = numpy.maximum(heightfield.sample_many(p1[:, 0], p1[:, 1]),
+                      heightfield.sample_many(p2[:, 0], p2[:, 1])) + 0.2
+    p1[:, 2] = z
+    p2[:, 2] = z
+    vertices = numpy.stack((p1, p2), axis=1).reshape(-1, 3)
+    # Colours by class, two vertices per probe
+    palette = numpy.array([
+        (0.2, 0.2, 0.2, 0.0),
+        (0.0, 0.0, 0.4, 0.0),
+        (0.4, 0.0, 0.0, 0.0),
+        ])
+    kind = numpy.where(steepest > 0.1, 2, numpy.where(n > 1000, 1, 0))
+    colors = numpy.repeat(palette[kind], 2 * probe_counts, axis=0)
+    # Two triangles between each probe and the next one on the same road
+    v = 2 * numpy.flatnonzero(i < probe_counts[road] - 1)
+    indices = numpy.concatenate((
+        numpy.stack((v, v + 1, v + 2), axis=1),
+        numpy.stack((v + 2, v + 1, v + 3), axis=1),
+        ), axis=1).reshape(-1, 3)
+    return vertices, colors, indices
+
+
+class Heightfield:
+    """Elevation sampled once on a square grid and interpolated bilinearly.
+
+    The grid spans `diameter` metres around `origin` with one sample every
+    `resolution` metres; points outside the grid fall back to the exact
+    elevation. `error` bounds the difference between the interpolated and the
+    exact elevation anywhere on the grid: bilinear interpolation over cells
+    of side h is off by at most h^2 / 8 times the largest second derivatives
+    along x and along y (see elevation_curvature_bound). `dx` and `dy` are
+    the slopes of the elevation along x and y at the same samples, from the
+    same noise pass as `heights`. With `estimate`,
+    `estimate` is also the largest difference actually found at the cell
+    centres, an empirical measure of the relief that is usually well below
+    the bound; it costs another noise evaluation per cell, so otherwise it
+    is None.
+    """
+
+    def __init__(self, diameter=10000.0, resolution=80.0, origin=(0.0, 0.0),
+                 heights=None, dx=None, dy=None, estimate=False):
         self.diameter = int(diameter)
         self.resolution = int(resolution)
+        self.origin = origin
+        r = int(self.diameter / 2.0)
+        axis = numpy.arange(-r, r + 1, self.resolution, dtype=numpy.float64)
+        self.n = len(axis)
+        self.xs = axis + origin[0]
+        self.ys = axis + origin[1]
+        self.error = self.resolution ** 2 / 8.0 * 2 * elevation_curvature_bound()
+        if heights is not None:
+            # Previously computed grid, e.g. loaded from a cache
+            self.heights = heights
+            self.dx = dx
+            self.dy = dy
+            self.estimate = None
+            return
+        self.heights, self.dx, self.dy = elevation_grad_array(*self.grid())
+        self.estimate = None
+        if not estimate:
+            return
+        # Measure the interpolation error at the cell centres
+        h = self.heights
+        approx = (h[:-1, :-1] + h[1:, :-1] + h[:-1, 1:] + h[1:, 1:]) / 4.0
+        cx = (self.xs[:-1] + self.xs[1:]) / 2.0
+        cy = (self.ys[:-1] + self.ys[1:]) / 2.0
+        exact = elevation_array(*numpy.meshgrid(cx, cy, indexing='ij'))
+        self.estimate = float(numpy.abs(exact - approx).max()) if exact.size else 0.0
+
+    def grid(self):
+        return numpy.meshgrid(self.xs, self.ys, indexing='ij')
+
+    def sample(self, x, y):
+        u = (x - self.xs[0]) / self.resolution
+        v = (y - self.ys[0]) / self.resolution
+        if not (0 <= u <= self.n - 1 and 0 <= v <= self.n - 1):
+            return elevation(x, y)
+        # Cells on the far edges are interpolated from their lower neighbour
+        i = min(floor(u), self.n - 2)
+        j = min(floor(v), self.n - 2)
+        u -= i
+        v -= j
+        h = self.heights
+        return float(
+            (h[i, j] * (1 - u) + h[i + 1, j] * u) * (1 - v) +
+            (h[i, j + 1] * (1 - u) + h[i + 1, j + 1] * u) * v)
+
+    def _interpolate(self, grids, xs, ys):
+        """`grids` interpolated at points (xs, ys) and the points outside.
+
+        Returns the points as arrays of at least one dimension, so that
+        those outside can be filled in, their mask and the interpolated
+        values of each grid.
+        """
+        xs, ys = numpy.broadcast_arrays(numpy.asarray(xs, dtype=numpy.float64),
+                                        numpy.asarray(ys, dtype=numpy.float64))
+        xs, ys = numpy.atleast_1d(xs, ys)
+        u = (xs - self.xs[0]) / self.resolution
+        v = (ys - self.ys[0]) / self.resolution
+        outside = ~((u >= 0) & (u <= self.n - 1) & (v >= 0) & (v <= self.n - 1))
+        i = numpy.clip(numpy.floor(u), 0, self.n - 2).astype(numpy.int64)
+        j = numpy.clip(numpy.floor(v), 0, self.n - 2).astype(numpy.int64)
+        u = u - i
+        v = v - j
+        values = [((h[i, j] * (1 - u) + h[i + 1, j] * u) * (1 - v) +
+                   (h[i, j + 1] * (1 - u) + h[i + 1, j + 1] * u) * v)
+                  for h in grids]
+        return xs, ys, outside, values
+
+    def sample_many(self, xs, ys):
+        shape = numpy.broadcast(xs, ys).shape
+        xs, ys, outside, (result,) = self._interpolate([self.heights], xs, ys)
+        if outside.any():
+            result[outside] = elevation_array(xs[outside], ys[outside])
+        return result.reshape(shape)
+
+    def sample_grad_many(self, xs, ys):
+        """Slopes along x and y at points (xs, ys), as sample_many."""
+        shape = numpy.broadcast(xs, ys).shape
+        xs, ys, outside, (dx, dy) = self._interpolate([self.dx, self.dy], xs, ys)
+        if outside.any():
+            h, dx[outside], dy[outside] = elevation_grad_array(xs[outside], ys[outside])
+        return dx.reshape(shape), dy.reshape(shape)
+
+
+class Terrain:
+
+    def __init__(self, diameter=10000.0, resolution=80.0, heightfield=None,
+                 rng=None):
+        self.fmt = GeomVertexFormat.getV3c4()
+        self.rng = rng
+        if heightfield is None:
+            heightfield = Heightfield(diameter, resolution)
+        self.heightfield = heightfield
+        self.diameter = heightfield.diameter
+        self.resolution = heightfield.resolution
+
+    def arrays(self):
+        xs, ys = self.heightfield.grid()
+        heights = self.heightfield.heights
+        vertices = numpy.stack((xs, ys, heights), axis=-1).reshape(-1, 3)
+        colors = shaded_colors(elevation_color_array(heights, self.rng),
+                               self.heightfield.dx, self.heightfield.dy)
+        colors = colors.reshape(-1, 4)
+        return vertices, colors, grid_triangles(self.heightfield.n)
 
     def primitives(self, vdata):
-        vertex = GeomVertexWriter(vdata, 'vertex')
-        color = GeomVertexWriter(vdata, 'color')
-        r = int(self.diameter / 2.0)
-        n = 0
-        for i in range(-r, r + 1, self.resolution):
-            for j in range(-r, r + 1, self.resolution):
-                h = elevation(i, j)
-                vertex.addData3f(i, j, h)
-                color.addData4f(elevation_color(h))
-            n += 1
-        for i in range(n - 1):
-            row = GeomTristrips(Geom.UHStatic)
-            for j in range(n):
-                t = i * n + j
-                b = t + n
-                row.addVertices(t, b)
-            row.closePrimitive()
-            yield row
+        vertices, colors, indices = self.arrays()
+        write_vertices(vdata, vertex=vertices, color=colors)
+        yield triangles(indices)
 
     def geom(self):
         vdata = GeomVertexData('TerrainVD', self.fmt, Geom.UHStatic)
         geom = Geom(vdata)
         for primitive in self.primitives(vdata):
             geom.addPrimitive(primitive)
+        count('geoms')
         return geom
 
     def node(self):
@@ -85,42 +334,38 @@ class Terrain:
 
 class Landmarks:
 
-    def __init__(self, diameter, density):
+    def __init__(self, diameter, density, heightfield=None, rng=None):
         self.fmt = GeomVertexFormat.getV3c4()
         self.diameter = diameter
+        if heightfield is None:
+            heightfield = Heightfield(diameter)
+        self.heightfield = heightfield
         r = diameter / 2
         # Sample random points in a 2d plane
         points_2d = []
         for i in range(int(density * pi * r**2)):
-            x, y = random_in_circle()
+            x, y = random_in_circle(rng)
             points_2d.append((x * r, y * r))
         # Compute triangulations
-        triangulation = DelaunayTri(points_2d)
+        with span('delaunay'):
+            triangulation = DelaunayTri(points_2d)
         # Save points in 3d space
-        self.points = []
-        for x, y in triangulation.points:
-            p = Vec3(x, y, elevation(x, y))
-            self.points.append(p)
+        xs, ys = numpy.array(triangulation.points, dtype=numpy.float64).T
+        zs = heightfield.sample_many(xs, ys)
+        self.points = numpy.stack((xs, ys, zs), axis=1)
         # Save triangles
         self.vertices = triangulation.vertices
         # Save a graph with the triangulation
-        self.nodes = [set() for i in range(len(self.points))]
-        self.edges = []
-        for a, b, c in triangulation.vertices:
-            self.nodes[a] |= {b, c}
-            self.nodes[b] |= {a, c}
-            self.nodes[c] |= {a, b}
-            self.edges.append((a, b))
-            self.edges.append((b, c))
-            self.edges.append((c, a))
+        self.graph = RoadGraph(self.points, self.vertices)
+        self.edges = self.graph.edges
 
     def primitives_lines(self, vdata):
         vertex = GeomVertexWriter(vdata, 'vertex')
         color = GeomVertexWriter(vdata, 'color')
         n = len(self.points)
         # Points
-        for p in self.points:
-            vertex.addData3f(p.x, p.y, p.z)
+        for x, y, z in self.points.tolist():
+            vertex.addData3f(x, y, z)
             color.addData4f(0.2, 0.2, 0.2, 0.0)
         # Triangles
         for a, b, c in self.vertices:
@@ -130,56 +375,81 @@ class Landmarks:
             yield lines
 
     def primitives(self, vdata):
-        vertex = GeomVertexWriter(vdata, 'vertex')
-        color = GeomVertexWriter(vdata, 'color')
-        w = ROAD_WIDTH / 2.0
-        v = 0
-        for a, b in self.edges:
-            a, b = self.points[a], self.points[b]
-            ab = b - a
-            n = ab.length()
-            inc = abs(a.z - b.z) / n
-            probes = max(2, n / 25)
-            ab_ = Vec3(ab)
-            ab_.normalize()
-            pab = Vec3.up().cross(ab_) * w
-            road = GeomTristrips(Geom.UHStatic)
-            for i in range(0, int(probes) + 1):
-                p = a + ab / probes * i
-                p1 = p + pab
-                p2 = p - pab
-                z = max(elevation(p1.x, p1.y), elevation(p2.x, p2.y))
-                p1.z = z + 0.2
-                p2.z = z + 0.2
-                vertex.addData3f(p1)
-                vertex.addData3f(p2)
-                if inc > 0.1:
-                    color.addData4f(0.4, 0.0, 0.0, 0.0)
-                    color.addData4f(0.4, 0.0, 0.0, 0.0)
-                elif n > 1000:
-                    color.addData4f(0.0, 0.0, 0.4, 0.0)
-                    color.addData4f(0.0, 0.0, 0.4, 0.0)
-                else:
-                    color.addData4f(0.2, 0.2, 0.2, 0.0)
-                    color.addData4f(0.2, 0.2, 0.2, 0.0)
-                road.addVertices(v, v + 1)
-                v += 2
-            road.closePrimitive()
-            yield road
-        # for i in range(0, len(self.edges) * 4, 4):
-        #     road = GeomTristrips(Geom.UHStatic)
-        #     road.addVertices(i, i+1, i+2, i+3)
-        #     road.closePrimitive()
-        #     yield road
+        vertices, colors, indices = road_mesh(
+            *self.graph.endpoints(), self.heightfield)
+        write_vertices(vdata, vertex=vertices, color=colors)
+        yield triangles(indices)
 
     def geom(self):
         vdata = GeomVertexData('LandmarkVD', self.fmt, Geom.UHStatic)
         geom = Geom(vdata)
         for primitive in self.primitives(vdata):
             geom.addPrimitive(primitive)
+        count('geoms')
         return geom
 
     def node(self):
         node = GeomNode('LandmarkNode')
         node.addGeom(self.geom())
         return node
+
+
+class IncrementalLandmarks:
+    """Road network grown by inserting landmarks in batches.
+
+    The roads are the edges of an incremental Delaunay triangulation. They
+    are meshed per `tile` metres square, each road going to the tile of its
+    midpoint, and `insert` returns the tiles whose roads changed, so only
+    those need meshing again.
+    """
+
+    def __init__(self, heightfield, tile=1000.0, radius=1e5):
+        self.heightfield = heightfield
+        self.tile = tile
+        self.triangulation = Delaunay(radius=radius)
+        self.points = numpy.zeros((0, 3))
+        self.tiles = defaultdict(set)
+        self.change = None
+
+    def keys(self, edges):
+        middle = (self.points[edges[:, 0], :2] + self.points[edges[:, 1], :2]) / 2
+        return [tuple(key) for key in numpy.floor(middle / self.tile).astype(numpy.int64).tolist()]
+
+    def insert(self, points_2d):
+        """Add an (n, 2) array of landmarks and return the tiles changed."""
+        points_2d = numpy.asarray(points_2d, dtype=numpy.float64).reshape(-1, 2)
+        with span('delaunay'):
+            change = self.triangulation.insert(points_2d)
+        zs = self.heightfield.sample_many(points_2d[:, 0], points_2d[:, 1])
+        self.points = numpy.concatenate((
+            self.points, numpy.column_stack((points_2d, zs))))
+        changed = set()
+        for key, edge in zip(self.keys(change.destroyed_edges),
+                             change.destroyed_edges.tolist()):
+            self.tiles[key].discard(tuple(edge))
+            changed.add(key)
+        for key, edge in zip(self.keys(change.created_edges),
+                             change.created_edges.tolist()):
+            self.tiles[key].add(tuple(edge))
+            changed.add(key)
+        self.change = change
+        return changed
+
+    def edges(self, key=None):
+        """Roads of the tile `key`, or of every tile, as an (n, 2) array."""
+        if key is None:
+            edges = [edge for tile in self.tiles.values() for edge in tile]
+        else:
+            edges = self.tiles.get(key, ())
+        return numpy.array(sorted(edges), dtype=numpy.int64).reshape(-1, 2)
+
+    def tile_mesh(self, key):
+        """Road mesh arrays of the tile `key`, None if it has no roads."""
+        edges = self.edges(key)
+        if not len(edges):
+            return None
+        return road_mesh(self.points[edges[:, 0]], self.points[edges[:, 1]],
+                         self.heightfield)
+
+    def graph(self):
+        return RoadGraph(self.points, self.triangulation.vertices())
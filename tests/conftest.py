@@ -0,0 +1,24 @@
+import os
+import sys
+
+import numpy
+
+# The modules live at the top of the repository, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def coordinates(dimensions, n=2000):
+    """Random coordinates of both signs, integers and points just around them."""
+    rng = numpy.random.default_rng(0)
+    random = rng.uniform(-300.0, 300.0, (dimensions, n))
+    integers = rng.integers(-300, 300, (dimensions, n)).astype(numpy.float64)
+    around = integers + rng.choice([-1e-9, 0.0, 1e-9], (dimensions, n))
+    # Mixing an integer axis with random ones, and -0.0
+    mixed = numpy.where(rng.random((dimensions, n)) < 0.5, integers, random)
+    zeros = numpy.array([[0.0, -0.0, 0.5, -0.5, 1.0, -1.0]] * dimensions)
+    return numpy.concatenate((random, integers, around, mixed, zeros), axis=1)
+
+
+def scalar(function, coords, *args):
+    """`function` of `args` and each point of `coords`, one at a time."""
+    return numpy.array([function(*args, *point) for point in coords.T.tolist()])
@@ -0,0 +1,19 @@
+"""Terrain chunks built on a Pipeline are those built one at a time."""
+
+import numpy
+from panda3d.core import NodePath
+
+from chunks import TerrainChunks
+from pipeline import Pipeline
+
+
+def test_build_many_on_pipeline():
+    terrain = TerrainChunks(NodePath('render'), seed=3)
+    keys = terrain.wanted(0.0, 0.0)[:6]
+    with Pipeline(2) as pipeline:
+        pooled = list(terrain.build_many(keys, pipeline))
+    assert [key for key, heightfield, mesh in pooled] == keys
+    for (key, heightfield, mesh), (_, expected, serial) in zip(pooled, terrain.build_many(keys)):
+        numpy.testing.assert_array_equal(heightfield.heights, expected.heights)
+        for a, b in zip(mesh, serial):
+            numpy.testing.assert_array_equal(a, b)
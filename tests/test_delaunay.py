@@ -0,0 +1,85 @@
+"""The incremental triangulation is the Delaunay triangulation of pyhull,
+and the changes it reports add up to it."""
+
+import numpy
+import pytest
+from pyhull.delaunay import DelaunayTri
+
+from delaunay import Delaunay
+from roads import RoadGraph
+from terrain import Heightfield, IncrementalLandmarks
+
+
+def edges(points, triangles):
+    flat = numpy.column_stack((points, numpy.zeros(len(points))))
+    return RoadGraph(flat, triangles).edges
+
+
+def reference_edges(points):
+    return edges(points, numpy.array(DelaunayTri(points.tolist()).vertices))
+
+
+def triangle_set(triangles):
+    return {tuple(sorted(t)) for t in numpy.asarray(triangles).tolist()}
+
+
+def edge_set(edges):
+    return {tuple(e) for e in numpy.asarray(edges).tolist()}
+
+
+def batches(seed, sizes):
+    rng = numpy.random.default_rng(seed)
+    return [rng.uniform(-4000.0, 4000.0, (n, 2)) for n in sizes]
+
+
+@pytest.mark.parametrize('seed, sizes', [
+    (0, [1500]),
+    (1, [1000, 400, 100]),
+    (2, [1, 2, 3, 500, 50]),
+    ])
+def test_matches_pyhull(seed, sizes):
+    delaunay = Delaunay(radius=5000.0)
+    for batch in batches(seed, sizes):
+        delaunay.insert(batch)
+    points = numpy.concatenate(batches(seed, sizes))
+    numpy.testing.assert_array_equal(delaunay.points(), points)
+    numpy.testing.assert_array_equal(edges(points, delaunay.vertices()),
+                                     reference_edges(points))
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_changes_add_up(seed):
+    delaunay = Delaunay(radius=5000.0)
+    triangles = set()
+    current = set()
+    for batch in batches(seed, [300, 200, 50, 1, 100]):
+        change = delaunay.insert(batch)
+        created = edge_set(change.created_edges)
+        destroyed = edge_set(change.destroyed_edges)
+        after = edge_set(edges(delaunay.points(), delaunay.vertices()))
+        # Only edges from before are destroyed, and only new ones created
+        assert destroyed <= current
+        assert not created & current
+        assert (current - destroyed) | created == after
+        created = triangle_set(change.created_triangles)
+        destroyed = triangle_set(change.destroyed_triangles)
+        assert destroyed <= triangles
+        assert (triangles - destroyed) | created == triangle_set(delaunay.vertices())
+        triangles = triangle_set(delaunay.vertices())
+        current = after
+
+
+def test_incremental_landmarks():
+    landmarks = IncrementalLandmarks(Heightfield(10000, 400), tile=1000.0)
+    tiles = {}
+    for batch in batches(3, [800, 200, 100]):
+        changed = landmarks.insert(batch)
+        tiles.update((key, landmarks.edges(key)) for key in changed)
+    points = numpy.concatenate(batches(3, [800, 200, 100]))
+    expected = reference_edges(points)
+    numpy.testing.assert_array_equal(landmarks.edges(), landmarks.graph().edges)
+    numpy.testing.assert_array_equal(landmarks.edges(), expected)
+    # The tiles reported as changed hold every road
+    kept = numpy.concatenate([e for e in tiles.values() if len(e)])
+    assert edge_set(kept) == edge_set(expected)
+    assert len(kept) == len(expected)
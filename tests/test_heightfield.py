@@ -0,0 +1,53 @@
+"""Heightfield sampling matches the exact elevation where it should."""
+
+import numpy
+
+from pipeline import Pipeline
+from terrain import Heightfield, elevation_array, elevation_grad_array
+
+
+def test_sample_many_scalar_outside():
+    heightfield = Heightfield(10000, 640)
+    # The grid ends at 4600, short of diameter / 2
+    assert float(heightfield.sample_many(4800.0, 0.0)) == float(elevation_array(4800.0, 0.0))
+    assert heightfield.sample_many(4800.0, 0.0).shape == ()
+
+
+def test_sample_many_matches_sample():
+    heightfield = Heightfield(2000, 80)
+    rng = numpy.random.default_rng(0)
+    xs, ys = rng.uniform(-1200.0, 1200.0, (2, 200))
+    numpy.testing.assert_allclose(
+        heightfield.sample_many(xs, ys),
+        [heightfield.sample(x, y) for x, y in zip(xs.tolist(), ys.tolist())])
+
+
+def test_estimate_only_when_asked():
+    assert Heightfield(2000, 80).estimate is None
+    heightfield = Heightfield(2000, 80, estimate=True)
+    assert 0.0 <= heightfield.estimate <= heightfield.error
+
+
+def test_pipeline_heightfield():
+    with Pipeline(2) as pipeline:
+        grid = pipeline.heightfield(2000, 80)
+    numpy.testing.assert_array_equal(grid.heights, Heightfield(2000, 80).heights)
+
+
+def test_gradients_from_the_height_pass():
+    heightfield = Heightfield(2000, 80)
+    h, dx, dy = elevation_grad_array(*heightfield.grid())
+    numpy.testing.assert_array_equal(heightfield.heights, h)
+    numpy.testing.assert_array_equal(heightfield.dx, dx)
+    numpy.testing.assert_array_equal(heightfield.dy, dy)
+
+
+def test_sample_grad_many():
+    heightfield = Heightfield(2000, 80)
+    # Exact on the samples and outside the grid
+    xs, ys = heightfield.grid()
+    dx, dy = heightfield.sample_grad_many(xs, ys)
+    numpy.testing.assert_array_equal(dx, heightfield.dx)
+    numpy.testing.assert_array_equal(dy, heightfield.dy)
+    h, dx, dy = elevation_grad_array(1500.0, -20.0)
+    assert heightfield.sample_grad_many(1500.0, -20.0) == (dx, dy)
@@ -0,0 +1,42 @@
+"""The "_array" noise functions give exactly the scalar functions' values."""
+
+import numpy
+import pytest
+
+import noise
+from conftest import coordinates, scalar
+
+
+@pytest.mark.parametrize('dimensions, raw, raw_array', [
+    (2, noise.raw_noise_2d, noise.raw_noise_2d_array),
+    (3, noise.raw_noise_3d, noise.raw_noise_3d_array),
+    (4, noise.raw_noise_4d, noise.raw_noise_4d_array),
+    ])
+def test_raw_noise_array(dimensions, raw, raw_array):
+    coords = coordinates(dimensions)
+    numpy.testing.assert_array_equal(raw_array(*coords), scalar(raw, coords))
+
+
+@pytest.mark.parametrize('dimensions, octave, octave_array', [
+    (2, noise.octave_noise_2d, noise.octave_noise_2d_array),
+    (3, noise.octave_noise_3d, noise.octave_noise_3d_array),
+    (4, noise.octave_noise_4d, noise.octave_noise_4d_array),
+    ])
+def test_octave_noise_array(dimensions, octave, octave_array):
+    coords = coordinates(dimensions, 500)
+    args = (4, 0.5, 0.01)
+    numpy.testing.assert_array_equal(octave_array(*args, *coords),
+                                     scalar(octave, coords, *args))
+
+
+def test_scaled_octave_noise_2d_array():
+    coords = coordinates(2, 500)
+    args = (3, 0.5, 0.002, 0.0, 250.0)
+    numpy.testing.assert_array_equal(
+        noise.scaled_octave_noise_2d_array(*args, *coords),
+        scalar(noise.scaled_octave_noise_2d, coords, *args))
+
+
+def test_array_shape():
+    x = numpy.linspace(-5.0, 5.0, 12).reshape(3, 4)
+    assert noise.raw_noise_2d_array(x, 0.5).shape == (3, 4)
@@ -0,0 +1,89 @@
+"""Every noise backend gives exactly the values of noise.py."""
+
+import numpy
+import pytest
+
+import noise
+import noise_backends
+import terrain
+from conftest import coordinates, scalar
+
+
+def backends():
+    names = noise_backends.available()
+    if 'numba' not in names:
+        names.append(pytest.param('numba', marks=pytest.mark.skip('numba is not installed')))
+    return names
+
+
+@pytest.fixture(params=[None, 1234])
+def seeded(request):
+    previous = noise.current_seed()
+    noise.seed(request.param)
+    yield
+    noise.seed(previous)
+
+
+@pytest.mark.parametrize('name', backends())
+@pytest.mark.parametrize('dimensions', [2, 3, 4])
+def test_raw_noise(name, dimensions, seeded):
+    backend = noise_backends.get(name)
+    raw = getattr(backend, 'raw_noise_%dd' % dimensions)
+    expected = getattr(noise, 'raw_noise_%dd' % dimensions)
+    coords = coordinates(dimensions)
+    numpy.testing.assert_array_equal(raw(*coords), scalar(expected, coords))
+
+
+@pytest.mark.parametrize('name', backends())
+@pytest.mark.parametrize('dimensions', [2, 3, 4])
+def test_octave_noise(name, dimensions, seeded):
+    backend = noise_backends.get(name)
+    octave = getattr(backend, 'octave_noise_%dd' % dimensions)
+    expected = getattr(noise, 'octave_noise_%dd_array' % dimensions)
+    coords = coordinates(dimensions, 300)
+    numpy.testing.assert_array_equal(octave(3, 0.5, 0.01, *coords),
+                                     expected(3, 0.5, 0.01, *coords))
+
+
+@pytest.mark.parametrize('name', backends())
+def test_scaled_octave_noise_2d(name):
+    backend = noise_backends.get(name)
+    coords = coordinates(2, 300)
+    args = (terrain.NOISE_OCTAVES, terrain.NOISE_PERSISTENCE, terrain.NOISE_SCALE, -0.25, 1.0)
+    numpy.testing.assert_array_equal(backend.scaled_octave_noise_2d(*args, *coords),
+                                     scalar(noise.scaled_octave_noise_2d, coords, *args))
+
+
+@pytest.mark.parametrize('name', backends())
+def test_scaled_octave_noise_2d_grad(name, seeded):
+    backend = noise_backends.get(name)
+    coords = coordinates(2, 300)
+    args = (3, 0.5, 0.01, -0.25, 1.0)
+    numpy.testing.assert_array_equal(backend.scaled_octave_noise_2d_grad(*args, *coords),
+                                     noise.scaled_octave_noise_2d_grad_array(*args, *coords))
+
+
+@pytest.mark.parametrize('name', backends())
+def test_shapes(name):
+    backend = noise_backends.get(name)
+    x = numpy.linspace(-5.0, 5.0, 12).reshape(3, 4)
+    assert backend.raw_noise_2d(x, 0.5).shape == (3, 4)
+    assert numpy.shape(backend.raw_noise_3d(0.5, 1.5, 2.5)) == ()
+
+
+@pytest.mark.parametrize('name', backends())
+def test_check(name):
+    assert max(noise_backends.check(name, points=2000).values()) == 0.0
+
+
+@pytest.mark.parametrize('name', backends())
+def test_current_from_environment(name, monkeypatch):
+    monkeypatch.setattr(noise_backends, '_current', None)
+    monkeypatch.setenv('NOISE_BACKEND', name)
+    assert noise_backends.current().name == name
+    # Terrain's scalar and array paths both go through the backend
+    xs = numpy.array([123.4, -56.7, 0.0])
+    ys = numpy.array([-56.7, 1000.0, 0.0])
+    numpy.testing.assert_array_equal(
+        terrain.elevation_array(xs, ys),
+        [terrain.elevation(x, y) for x, y in zip(xs.tolist(), ys.tolist())])
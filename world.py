@@ -0,0 +1,119 @@
+import numpy
+from panda3d.core import NodePath, Vec3
+
+import noise
+import terrain
+from buildings import Archetypes, BuildingBatch
+from geometry import mesh_node
+from placement import Placement
+from seeds import derive, generator, stream
+from terrain import Heightfield, Landmarks, road_mesh
+
+
+class World:
+    """A whole city: heightfield, road network and buildings.
+
+    Everything that influences the result is listed in `params`, so that
+    equal parameters describe the same city. Each stage draws from its own
+    random stream derived from `seed`.
+    """
+
+    def __init__(self, seed=0, diameter=10000.0, resolution=80.0, city=8000.0,
+                 density=2.5/1000000, buildings=50, spread=5000.0):
+        self.seed = seed
+        self.params = {
+            'seed': seed,
+            'diameter': diameter,
+            'resolution': resolution,
+            'city': city,
+            'density': density,
+            'buildings': buildings,
+            'spread': spread,
+            'max_elevation': terrain.MAX_ELEVATION,
+            'noise_octaves': terrain.NOISE_OCTAVES,
+            'noise_persistence': terrain.NOISE_PERSISTENCE,
+            'noise_scale': terrain.NOISE_SCALE,
+            'road_width': terrain.ROAD_WIDTH,
+            }
+        self.heightfield = None
+        self.points = None
+        self.edges = None
+        # Building table: corners, number of levels and taper of each one
+        self.footprints = None
+        self.levels = None
+        self.tapers = None
+        self.roads = NodePath('Roads')
+        self.roads.setRenderModeThickness(1)
+        self.buildings = NodePath('Buildings')
+        self.buildings.setTwoSided(True)
+
+    def seed_noise(self):
+        """Make the noise functions use this world's permutation table."""
+        noise.seed(derive(self.seed, 'noise'))
+
+    def generate(self, pipeline=None, meshes=True, instance=True):
+        """Generate the world, on `pipeline`'s worker processes if given."""
+        for parent, nodePath in self.pieces(pipeline, meshes=meshes, instance=instance):
+            nodePath.reparentTo(parent)
+        return self
+
+    def pieces(self, pipeline=None, batch=1024, meshes=True, instance=True):
+        """Generate the world piece by piece.
+
+        Yields (parent, node) pairs, with parent either `roads` or
+        `buildings`, for the caller to attach to it. Roads come in batches of
+        `batch` edges. Buildings come one at a time as archetype instances,
+        or without `instance` merged into meshes of `batch` buildings, which
+        scales to far more buildings but has no levels of detail. Nothing is
+        attached to an existing scene graph, so this can run on a background
+        thread.
+
+        Without `meshes` only the heightfield, road graph and building table
+        are generated and nothing is yielded.
+        """
+        p = self.params
+        self.seed_noise()
+        if pipeline is None:
+            self.heightfield = Heightfield(p['diameter'], p['resolution'])
+        else:
+            self.heightfield = pipeline.heightfield(p['diameter'], p['resolution'])
+        # Landmarks
+        landmarks = Landmarks(p['city'], p['density'],
+                              heightfield=self.heightfield,
+                              rng=stream(self.seed, 'landmarks'))
+        self.points = landmarks.points
+        self.edges = landmarks.edges
+        if meshes and pipeline is None:
+            for i in range(0, len(self.edges), batch):
+                edges = self.edges[i:i + batch]
+                mesh = road_mesh(self.points[edges[:, 0]],
+                                 self.points[edges[:, 1]], self.heightfield)
+                yield self.roads, NodePath(mesh_node('LandmarkNode', *mesh))
+        elif meshes:
+            mesh = pipeline.roads(self.points, self.edges, self.heightfield)
+            yield self.roads, NodePath(mesh_node('LandmarkNode', *mesh))
+        # Buildings, on lots clear of each other and of the roads
+        rng = generator(self.seed, 'buildings')
+        placement = Placement(p['spread'], size=50.0,
+                              roads=landmarks.graph.index().edges)
+        lots = placement.place(p['buildings'], rng)
+        xs, ys = lots.T
+        zs = self.heightfield.sample_many(xs, ys) - 10
+        self.footprints = numpy.stack((
+            numpy.stack((xs, ys, zs), axis=1),
+            numpy.stack((xs, ys + 50.0, zs), axis=1),
+            numpy.stack((xs + 50.0, ys + 50.0, zs), axis=1),
+            numpy.stack((xs + 50.0, ys, zs), axis=1),
+            ), axis=1)
+        self.levels = (40 + rng.random(len(lots)) * 60).astype(numpy.int64)
+        self.tapers = numpy.full(len(lots), 0.99)
+        if meshes and not instance:
+            buildings = BuildingBatch(self.footprints, self.levels, self.tapers)
+            for node in buildings.nodes(batch):
+                yield self.buildings, NodePath(node)
+        elif meshes:
+            archetypes = Archetypes()
+            for footprint, levels in zip(self.footprints.tolist(), self.levels.tolist()):
+                border = tuple(Vec3(*corner) for corner in footprint)
+                tops = [i * 2.5 for i in range(levels)]
+                yield self.buildings, archetypes.instance(border, tops)